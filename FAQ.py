@@ -1,28 +1,30 @@
 import os
 import time
-from langchain_groq import ChatGroq
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain.chains.combine_documents import create_stuff_documents_chain
-from langchain_core.prompts import ChatPromptTemplate
-from langchain.chains import create_retrieval_chain
-from langchain_community.vectorstores import FAISS
-from langchain_community.document_loaders import TextLoader
+import asyncio
+import threading
 from dotenv import load_dotenv
+from semantic_cache import SemanticCache
+from retrieval import RetrievalPolicy, chunking_profile, scored_search
+from sessions import history_block, retrieval_query
+from metrics import span, observe
 
 load_dotenv()
 
 # Load API keys
-os.environ['GROQ_API_KEY'] = os.getenv("GROQ_API_KEY")
+if os.getenv("GROQ_API_KEY"):
+    os.environ['GROQ_API_KEY'] = os.getenv("GROQ_API_KEY")
 groq_api_key = os.getenv("GROQ_API_KEY")
 
-# Initialize embeddings and LLM
-embeddings = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
-llm = ChatGroq(groq_api_key=groq_api_key, model_name="Llama3-8b-8192")
+# Near-duplicate questions are answered from here instead of another Groq round trip
+answer_cache = SemanticCache()
 
-# Create prompt template
-prompt = ChatPromptTemplate.from_template(
-    """
+# How many FAQ chunks reach the prompt: score threshold, dynamic k and a token budget
+retrieval_policy = RetrievalPolicy()
+
+# Products searched with the same query vector (see product_index.py)
+PRODUCT_K = int(os.getenv("PRODUCT_K", "3"))
+
+PROMPT_TEMPLATE = """
     You are a friendly AI assistant for Scalixity, an e-commerce platform. Your goal is to provide helpful and engaging responses to user inquiries. Follow these guidelines:
 
     1. If the information is in the context:
@@ -42,59 +44,266 @@ prompt = ChatPromptTemplate.from_template(
     {context}
     </context>
     
-    Question: {input}
+    {history}Question: {input}
     
     Answer:
     """
-)
+
+# The embedding model, LLM, FAISS indexes and LangChain stack are only imported and
+# built on first use (or by warm_up()), so importing this module stays cheap
+_components = {}
+_components_lock = threading.RLock()
+
+def _component(name, factory):
+    component = _components.get(name)
+    if component is None:
+        with _components_lock:
+            component = _components.get(name)
+            if component is None:
+                component = _components[name] = factory()
+    return component
+
+def _make_embeddings():
+    # EMBEDDINGS_BACKEND=fake swaps in the local stand-in
+    if os.getenv("EMBEDDINGS_BACKEND") == "fake":
+        from fake_llm import FakeEmbeddings
+        return FakeEmbeddings()
+    from langchain_huggingface import HuggingFaceEmbeddings
+    return HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
+
+def _make_llm():
+    # LLM_BACKEND=fake swaps in the local stand-in
+    if os.getenv("LLM_BACKEND") == "fake":
+        from fake_llm import FakeLLM
+        return FakeLLM()
+    from langchain_groq import ChatGroq
+    return ChatGroq(groq_api_key=groq_api_key, model_name="Llama3-8b-8192")
+
+def _make_index_manager():
+    from faq_index import FAQIndexManager
+    # The FAQ index is built once, persisted to disk and only rebuilt when the FAQ text changes
+    chunk_size, chunk_overlap = chunking_profile()
+    manager = FAQIndexManager("scalixity_faq_data.txt", get_embeddings(), chunk_size=chunk_size,
+                              chunk_overlap=chunk_overlap)
+    manager.add_reload_listener(lambda vectorstore: answer_cache.clear())
+    return manager
+
+def _make_product_index():
+    from product_index import ProductIndex
+    # Catalog embeddings built offline by `python product_index.py build`
+    return ProductIndex(get_embeddings())
+
+def _make_batcher():
+    from embed_batcher import EmbedBatcher
+    # Questions go through embed_documents in batches; with the default (empty) query and
+    # encode kwargs HuggingFaceEmbeddings produces the same vectors either way
+    return EmbedBatcher(get_embeddings())
+
+def _make_document_chain():
+    from langchain.chains.combine_documents import create_stuff_documents_chain
+    from langchain_core.prompts import ChatPromptTemplate
+    return create_stuff_documents_chain(get_llm(), ChatPromptTemplate.from_template(PROMPT_TEMPLATE))
+
+def get_embeddings():
+    return _component("embeddings", _make_embeddings)
+
+def get_llm():
+    return _component("llm", _make_llm)
+
+def get_index_manager():
+    return _component("index_manager", _make_index_manager)
+
+def get_product_index():
+    return _component("product_index", _make_product_index)
+
+def get_batcher():
+    return _component("batcher", _make_batcher)
+
+def batcher_stats():
+    """Micro-batching counters, or None before the first question."""
+    batcher = _components.get("batcher")
+    return batcher.stats() if batcher is not None else None
+
+def batching_enabled():
+    # EMBED_BATCHING=0 embeds every question on its own thread instead
+    return os.getenv("EMBED_BATCHING", "1") == "1"
+
+def embed_query(text):
+    """Embed a question, micro-batched with concurrent ones unless EMBED_BATCHING=0."""
+    if batching_enabled():
+        return get_batcher().embed_query(text)
+    return get_embeddings().embed_query(text)
+
+async def aembed_query(text):
+    if batching_enabled():
+        batcher = await asyncio.to_thread(get_batcher)
+        return await batcher.aembed_query(text)
+    return await asyncio.to_thread(lambda: get_embeddings().embed_query(text))
+
+def get_document_chain():
+    """Stuff-documents chain, built once and reused for every question."""
+    return _component("document_chain", _make_document_chain)
 
 def create_vector_embedding():
+    """Return the FAQ vector store, loading it from disk or building it if the FAQ text changed."""
     try:
-        # Load and process the text file
-        loader = TextLoader("scalixity_faq_data.txt")
-        documents = loader.load()
-        
-        # Split text into chunks
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1000,
-            chunk_overlap=200
-        )
-        texts = text_splitter.split_documents(documents)
-        
-       
-        start_time = time.time()
-        vectorstore = FAISS.from_documents(texts, embeddings)
-      
-        
-        return vectorstore
+        return get_index_manager().get_vectorstore()
     except Exception as e:
         print(f"Error creating vector store: {str(e)}")
         return None
 
-def main(user_prompt):
- 
+def warm_up():
+    """Load everything the first question would otherwise wait for; returns seconds per step."""
+    steps = {}
+    for name, step in (
+        ("embeddings", lambda: get_embeddings().embed_query("warm up")),
+        ("index", create_vector_embedding),
+        ("product_index", lambda: get_product_index().get()),
+        ("llm", get_document_chain),
+    ):
+        start_time = time.time()
+        step()
+        steps[name] = round(time.time() - start_time, 3)
+    return steps
+
+def is_ready():
+    """True once the model, the FAQ index and the chain are loaded."""
+    manager = _components.get("index_manager")
+    return ("embeddings" in _components and "document_chain" in _components
+            and manager is not None and manager.loaded)
+
+def retrieve(vectorstore, query_vector):
+    """Search the FAQ chunks and the product catalog with one query vector; returns (context, products).
+
+    The context is what retrieval_policy keeps of both, empty for an out-of-scope question.
+    """
+    product_index = get_product_index()
+    with span("retrieve"):
+        scored = scored_search(vectorstore, query_vector, retrieval_policy.max_k)
+    with span("product_search"):
+        products = product_index.search(query_vector, k=PRODUCT_K)
+    return retrieval_policy.select(scored, product_index.as_documents(products)), products
+
+def reload_index():
+    """Hot-reload the FAQ index; in-flight requests keep the store they already hold."""
+    try:
+        return {"reloaded": get_index_manager().reload()}
+    except Exception as e:
+        return {"error": f"Error reloading knowledge base: {str(e)}"}
 
+def main(user_prompt, history=None):
+    """Answer a question; `history` is the asker's Session (sessions.py) for a follow-up question.
+
+    An answer that depends on earlier turns is neither looked up in nor stored to the answer cache.
+    """
     vectorstore = create_vector_embedding()
     if not vectorstore:
         return {"error": "Failed to initialize the knowledge base."}
 
-    # Create and execute the chain
-    document_chain = create_stuff_documents_chain(llm, prompt)
-    retriever = vectorstore.as_retriever()
-    retrieval_chain = create_retrieval_chain(retriever, document_chain)
+    try:
+        start_time = time.time()
+        # Embed once: the same vector serves the answer cache and the FAISS search
+        with span("embed"):
+            query_vector = embed_query(retrieval_query(history, user_prompt))
+        cached = answer_cache.lookup(query_vector) if not history else None
+        if cached is not None:
+            return {
+                **cached,
+                "processing_time": time.time() - start_time,
+                "cache": "hit"
+            }
+
+        context, products = retrieve(vectorstore, query_vector)
+        with span("llm"):
+            answer = get_document_chain().invoke(
+                {"input": user_prompt, "context": context, "history": history_block(history)})
+        if not history:
+            answer_cache.store(query_vector, {"answer": answer, "products": products})
+        processing_time = time.time() - start_time
+
+        return {
+            "answer": answer,
+            "products": products,
+            "processing_time": processing_time,
+            "cache": "bypass" if history else "miss"
+        }
+    except Exception as e:
+        return {"error": f"Error processing question: {str(e)}"}
+
+async def amain(user_prompt, history=None):
+    """Async variant of main() for the ASGI server; embedding, index loads and searches run in threads."""
+    vectorstore = await asyncio.to_thread(create_vector_embedding)
+    if not vectorstore:
+        return {"error": "Failed to initialize the knowledge base."}
 
     try:
         start_time = time.time()
-        response = retrieval_chain.invoke({"input": user_prompt})
+        with span("embed"):
+            query_vector = await aembed_query(retrieval_query(history, user_prompt))
+        cached = answer_cache.lookup(query_vector) if not history else None
+        if cached is not None:
+            return {
+                **cached,
+                "processing_time": time.time() - start_time,
+                "cache": "hit"
+            }
+
+        # The first call loads the product index from disk, and every call runs FAISS searches
+        context, products = await asyncio.to_thread(retrieve, vectorstore, query_vector)
+        document_chain = await asyncio.to_thread(get_document_chain)
+        with span("llm"):
+            answer = await document_chain.ainvoke(
+                {"input": user_prompt, "context": context, "history": history_block(history)})
+        if not history:
+            answer_cache.store(query_vector, {"answer": answer, "products": products})
         processing_time = time.time() - start_time
 
         return {
-            "answer": response["answer"],
-            "processing_time": processing_time
+            "answer": answer,
+            "products": products,
+            "processing_time": processing_time,
+            "cache": "bypass" if history else "miss"
         }
     except Exception as e:
         return {"error": f"Error processing question: {str(e)}"}
 
+def stream(user_prompt, history=None):
+    """Answer like main(), but yield the answer in pieces as the LLM produces them.
+
+    Yields {"token": ...} dicts, then one final dict with "products", "processing_time" and "cache",
+    or a single {"error": ...} dict.
+    """
+    vectorstore = create_vector_embedding()
+    if not vectorstore:
+        yield {"error": "Failed to initialize the knowledge base."}
+        return
+
+    try:
+        start_time = time.time()
+        with span("embed"):
+            query_vector = embed_query(retrieval_query(history, user_prompt))
+        cached = answer_cache.lookup(query_vector) if not history else None
+        if cached is not None:
+            yield {"token": cached["answer"]}
+            yield {"products": cached["products"], "processing_time": time.time() - start_time, "cache": "hit"}
+            return
+
+        context, products = retrieve(vectorstore, query_vector)
+        parts = []
+        llm_start = time.perf_counter()
+        inputs = {"input": user_prompt, "context": context, "history": history_block(history)}
+        for chunk in get_document_chain().stream(inputs):
+            parts.append(chunk)
+            yield {"token": chunk}
+        observe("llm", time.perf_counter() - llm_start)
+        if not history:
+            answer_cache.store(query_vector, {"answer": "".join(parts), "products": products})
+
+        yield {"products": products, "processing_time": time.time() - start_time,
+               "cache": "bypass" if history else "miss"}
+    except Exception as e:
+        yield {"error": f"Error processing question: {str(e)}"}
+
 if __name__ == "__main__":
     while True:
         user_prompt = input("\nYour question: ")
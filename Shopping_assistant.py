@@ -1,12 +1,12 @@
 import os
+import threading
 from dotenv import load_dotenv
-from langchain_community.llms import Ollama
-import mysql.connector
-from langchain.callbacks.tracers import LangChainTracer
-from langchain.callbacks.manager import CallbackManager
-from langsmith import Client
-from bs4 import BeautifulSoup
-from langchain_groq import ChatGroq
+from db_pool import get_db_connection
+from catalog_cache import CatalogCache
+from facet_index import COLOR_ATTRIBUTE_ID, SIZE_ATTRIBUTE_ID
+from product_search import search_products
+from pitch_engine import pitch_mode, build_batch_prompt, parse_batch_response
+from text_clean import clean_description
 
 # Load environment variables first
 load_dotenv()
@@ -14,113 +14,111 @@ load_dotenv()
 # Environment variables setup
 POSTGRES_URL = os.getenv("MY_SQL_URL")
 
-# Initialize LangChain tracer
-tracer = LangChainTracer()
-callback_manager = CallbackManager([tracer])
-
-# Initialize LangSmith client
-client = Client()
-os.environ['GROQ_API_KEY'] = os.getenv("GROQ_API_KEY")
+if os.getenv("GROQ_API_KEY"):
+    os.environ['GROQ_API_KEY'] = os.getenv("GROQ_API_KEY")
 groq_api_key = os.getenv("GROQ_API_KEY")
-# Initialize Ollama LLM with callbacks
-llm = ChatGroq(
-    groq_api_key = groq_api_key,
-    model="mistral",
-    temperature=0.7,
-    callback_manager=callback_manager
-)
-
-def get_db_connection():
-    try:
-        return mysql.connector.connect(
-            host=os.getenv("MYSQL_HOST"),
-            user=os.getenv("MYSQL_USER"),
-            password=os.getenv("MYSQL_PASSWORD"),
-            database=os.getenv("MYSQL_DATABASE")
-        )
-    except mysql.connector.Error as e:
-        raise Exception(f"Database connection failed: {str(e)}")
+
+# The tracer, LangSmith client and LLM are created on first use, so importing this
+# module (e.g. for `catalog`) does not pull in the LangChain stack
+_llm = None
+_llm_lock = threading.Lock()
+
+def get_llm():
+    global _llm
+    if _llm is None:
+        with _llm_lock:
+            if _llm is None:
+                if os.getenv("LLM_BACKEND") == "fake":
+                    from fake_llm import FakeLLM
+                    _llm = FakeLLM()
+                else:
+                    from langchain.callbacks.tracers import LangChainTracer
+                    from langchain.callbacks.manager import CallbackManager
+                    from langsmith import Client
+                    from langchain_groq import ChatGroq
+                    # Initialize LangChain tracer with the LangSmith client
+                    tracer = LangChainTracer(client=Client())
+                    _llm = ChatGroq(
+                        groq_api_key = groq_api_key,
+                        model="mistral",
+                        temperature=0.7,
+                        callback_manager=CallbackManager([tracer])
+                    )
+    return _llm
 
 def get_available_categories():
     conn = get_db_connection()
-    cur = conn.cursor()
+    cur = None
     try:
+        cur = conn.cursor()
         cur.execute("SELECT category_id, name FROM category_translations where category_id <> 1;")
         return {row[0]: row[1] for row in cur.fetchall()}
     except Exception as e:
         print(f"Error fetching categories: {str(e)}")
         return {}
     finally:
-        cur.close()
+        if cur is not None:
+            cur.close()
         conn.close()
 
 def get_available_sizes():
     conn = get_db_connection()
-    cur = conn.cursor()
+    cur = None
     try:
-        cur.execute("SELECT id, admin_name FROM ecommerce.attribute_options WHERE attribute_id = 24;")
+        cur = conn.cursor()
+        cur.execute("SELECT id, admin_name FROM ecommerce.attribute_options WHERE attribute_id = %s;",
+                    (SIZE_ATTRIBUTE_ID,))
         return {row[0]: row[1] for row in cur.fetchall()}
     except Exception as e:
         print(f"Error fetching sizes: {str(e)}")
         return {}
     finally:
-        cur.close()
+        if cur is not None:
+            cur.close()
         conn.close()
 
 def get_available_colors():
     conn = get_db_connection()
-    cur = conn.cursor()
+    cur = None
     try:
-        cur.execute("SELECT id, admin_name FROM ecommerce.attribute_options WHERE attribute_id = 23;")
+        cur = conn.cursor()
+        cur.execute("SELECT id, admin_name FROM ecommerce.attribute_options WHERE attribute_id = %s;",
+                    (COLOR_ATTRIBUTE_ID,))
         return {row[0]: row[1] for row in cur.fetchall()}
     except Exception as e:
         print(f"Error fetching colors: {str(e)}")
         return {}
     finally:
-        cur.close()
+        if cur is not None:
+            cur.close()
         conn.close()
 
-def find_products(category_id, size_id, color_id):
-    """Find products based on category ID, size ID, and color ID."""
-    if not category_id or not size_id or not color_id:
+# These tables almost never change, so they are loaded once and refreshed in the background
+catalog = CatalogCache({
+    "categories": get_available_categories,
+    "sizes": get_available_sizes,
+    "colors": get_available_colors,
+})
+
+def find_products(category_ids, size_ids, color_ids, cursor=None, page_size=None):
+    """Find one page of products based on category, size and color IDs (one id or a list each)."""
+    if not category_ids or not size_ids or not color_ids:
         return []
 
-    conn = get_db_connection()
-    cur = conn.cursor(dictionary=True)  # Enable fetching results as dictionaries
     try:
-        # Fetch product details using the provided query
-        query = """
-            SELECT DISTINCT pf.* 
-            FROM ecommerce.product_flat pf
-            JOIN ecommerce.product_categories pc 
-                ON pf.product_id = pc.product_id
-            JOIN ecommerce.product_attribute_values color_attr 
-                ON pf.product_id = color_attr.product_id 
-                AND color_attr.attribute_id = 23  -- ID for 'color' attribute
-                AND color_attr.integer_value = %s  -- Color option ID
-            JOIN ecommerce.product_attribute_values size_attr 
-                ON pf.product_id = size_attr.product_id 
-                AND size_attr.attribute_id = 24  -- ID for 'size' attribute
-                AND size_attr.integer_value = %s  -- Size option ID
-            WHERE pc.category_id = %s 
-                AND pf.status = 1;
-        """
-        # IMPORTANT: Order parameters as (color_id, size_id, category_id)
-        cur.execute(query, (color_id, size_id, category_id))
-        return cur.fetchall()  # Return the list of products
+        # Only the columns the assistant prints or pitches from are fetched
+        products, _ = search_products(category_ids, size_ids, color_ids, cursor=cursor, page_size=page_size,
+                                      columns=("product_id", "name", "description"))
+        return products
     except Exception as e:
         print(f"Error finding products: {str(e)}")
         return []
-    finally:
-        cur.close()
-        conn.close()
 
 def generate_product_pitch(product_description):
     """Generate a persuasive pitch for the product in a single response."""
     
-    # Parse the HTML content
-    soup = BeautifulSoup(product_description, "html.parser")
-    cleaned_text = soup.get_text(separator=" ")  # Extract text from HTML
+    # Strip the HTML and cap its length (memoized per description)
+    cleaned_text = clean_description(product_description)
     
     # Updated prompt to ensure a single concise response
     prompt = (f"The following is a product description extracted from an HTML page:\n\n"
@@ -128,16 +126,28 @@ def generate_product_pitch(product_description):
               f"Based on this description, provide a single, concise, and compelling pitch in one sentence. "
               f"Focus on the key benefit and selling point without repeating.\n\nPitch:")
     
-    response = llm.invoke(prompt).strip()
+    response = get_llm().invoke(prompt).strip()
     
     
     # If the response contains multiple sentences, extract only the first one
     return response.split(".")[0] + "." if "." in response else response
 
+def generate_product_pitches(product_descriptions):
+    """Generate pitches for several products in one LLM call; None marks items to retry singly."""
+    cleaned = [clean_description(description) for description in product_descriptions]
+    try:
+        response = get_llm().invoke(build_batch_prompt(cleaned))
+        content = getattr(response, "content", response)
+        pitches = parse_batch_response(content, len(cleaned))
+    except Exception as e:
+        print(f"Error generating batch pitches: {str(e)}")
+        pitches = [None] * len(cleaned)
+    return [pitch.split(".")[0] + "." if pitch and "." in pitch else pitch for pitch in pitches]
+
 def chat_with_assistant():
-    categories = get_available_categories()
-    sizes = get_available_sizes()
-    colors = get_available_colors()
+    categories, _ = catalog.get("categories")
+    sizes, _ = catalog.get("sizes")
+    colors, _ = catalog.get("colors")
 
     print("\nAvailable product categories:")
     for cid, cname in categories.items():
@@ -152,35 +162,41 @@ def chat_with_assistant():
         print(f"- {colname}")
     
     while True:
+        # Each answer may list several options, e.g. "red or blue" or "M, L"
         category_input = input("\nWhich category are you interested in? (or type 'quit' to exit): ").strip()
         if category_input.lower() in ['quit', 'exit', 'bye']:
             print("Thanks for visiting! Come back anytime! 👋")
             break
 
-        category_id = next((cid for cid, cname in categories.items() if cname.lower() == category_input.lower()), None)
-        if not category_id:
+        category_ids, unknown = catalog.resolve_many("categories", category_input)
+        if unknown or not category_ids:
             print("Invalid category. Please choose from the available options.")
             continue
 
         size_input = input("\nWhich size are you looking for?: ").strip()
-        size_id = next((sid for sid, sname in sizes.items() if sname.lower() == size_input.lower()), None)
-        if not size_id:
+        size_ids, unknown = catalog.resolve_many("sizes", size_input)
+        if unknown or not size_ids:
             print("Invalid size. Please choose from the available options.")
             continue
 
         color_input = input("\nWhich color do you prefer?: ").strip()
-        color_id = next((colid for colid, colname in colors.items() if colname.lower() == color_input.lower()), None)
-        if not color_id:
+        color_ids, unknown = catalog.resolve_many("colors", color_input)
+        if unknown or not color_ids:
             print("Invalid color. Please choose from the available options.")
             continue
 
-        products = find_products(category_id, size_id, color_id)
+        products = find_products(category_ids, size_ids, color_ids)
         if not products:
             print(f"No products found for {category_input} in size {size_input} and color {color_input}. 😔")
         else:
             print("\nHere are some products you might like:")
-            for product in products:
-                pitch = generate_product_pitch(product['description'])
+            if pitch_mode() == "batch":
+                pitches = generate_product_pitches([product['description'] for product in products])
+            else:
+                pitches = [None] * len(products)
+            for product, pitch in zip(products, pitches):
+                if pitch is None:
+                    pitch = generate_product_pitch(product['description'])
                 print(f"- {product['name']}")
                 print(f"  Why buy this product? {pitch}\n")
         
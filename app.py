@@ -1,18 +1,23 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
 import os
-from dotenv import load_dotenv
-import mysql.connector
-from FAQ import main as faq_main
-from Shopping_assistant import (
-    get_available_categories, 
-    get_available_colors, 
-    get_available_sizes,
-    find_products
-)
-from langchain_community.llms import Ollama
-import gc
+import json
+import time
 import threading
+from dotenv import load_dotenv
+from FAQ import main as faq_main, stream as faq_stream, reload_index, answer_cache, get_index_manager
+from FAQ import warm_up as faq_warm_up, is_ready as faq_is_ready, batcher_stats, retrieval_policy
+from Shopping_assistant import catalog
+from db_pool import get_db_connection, get_pool
+from pitch_engine import PitchEngine, build_batch_prompt, parse_batch_response
+from pitch_store import PitchStore
+from llm_registry import registry as llm_registry
+from product_search import search_products, facet_summary, as_ids, clamp_page_size
+from facet_index import facet_index, get_facet_index
+from text_clean import clean_description
+from metrics import metrics, span, track_request, timings_requested
+from single_flight import SingleFlight, normalize_question, stats as single_flight_stats
+from sessions import get_session_store
 
 # Load environment variables
 load_dotenv()
@@ -20,172 +25,437 @@ load_dotenv()
 app = Flask(__name__)
 CORS(app)
 
-# Create a thread-local storage
-thread_local = threading.local()
+PITCH_MODEL = "gemma2:2b"
+NO_DESCRIPTION = "No product description available."
+PITCH_UNAVAILABLE = "Unable to generate product pitch at this time."
+PITCH_ERROR = "Error generating product pitch."
+# Seconds a pitch may take; also the Ollama client's HTTP timeout, so an abandoned pitch frees its worker
+PITCH_TIMEOUT = float(os.getenv("PITCH_TIMEOUT", "20"))
 
-def get_llm():
-    """Get or create an LLM instance for the current thread."""
-    if not hasattr(thread_local, "llm"):
-        thread_local.llm = Ollama(
-            model="gemma2:2b",
-            temperature=0.7,
-            num_ctx=512,  # Reduce context window
-            num_thread=2,  # Limit number of threads
-        )
-    return thread_local.llm
-
-def cleanup_llm():
-    """Cleanup LLM resources."""
-    if hasattr(thread_local, "llm"):
-        del thread_local.llm
-        gc.collect()
-
-def get_db_connection():
-    """Create and return a database connection."""
+def make_ollama(**kwargs):
+    """Create an Ollama client, preferring langchain_ollama whose client keeps one HTTP session."""
+    if os.getenv("LLM_BACKEND") == "fake":
+        from fake_llm import FakeLLM
+        return FakeLLM()
     try:
-        connection = mysql.connector.connect(
-            host=os.getenv("MYSQL_HOST"),
-            user=os.getenv("MYSQL_USER"),
-            password=os.getenv("MYSQL_PASSWORD"),
-            database=os.getenv("MYSQL_DATABASE")
-        )
-        return connection
-    except mysql.connector.Error as e:
-        print(f"Error connecting to the database: {e}")
-        raise Exception(f"Database connection failed: {str(e)}")
+        from langchain_ollama import OllamaLLM
+        return OllamaLLM(model=PITCH_MODEL, client_kwargs={"timeout": PITCH_TIMEOUT}, **kwargs)
+    except ImportError:
+        from langchain_community.llms import Ollama
+        return Ollama(model=PITCH_MODEL, timeout=PITCH_TIMEOUT, **kwargs)
+
+# Pitch clients are created once and shared by all request and pitch threads
+llm_registry.register("pitch", lambda: make_ollama(
+    temperature=0.7,
+    num_ctx=512,  # Reduce context window
+    num_thread=2,  # Limit number of threads
+))
+# Batched pitches need room for several descriptions in one prompt
+llm_registry.register("pitch_batch", lambda: make_ollama(
+    temperature=0.7,
+    num_ctx=int(os.getenv("PITCH_BATCH_NUM_CTX", "2048")),
+    num_thread=2,
+))
+
+def get_llm():
+    """Get the shared pitch LLM client."""
+    return llm_registry.get("pitch")
+
+def get_batch_llm():
+    """Get the shared LLM client used for batched pitches."""
+    return llm_registry.get("pitch_batch")
+
+def pitch_prompt(product_description):
+    return (f"The following is a product description extracted from an HTML page:\n\n"
+      f"{clean_description(product_description)}\n\n"
+      f"Based on this description, provide a single, concise, and compelling pitch in one sentence. "
+      f"Focus on the key benefit and selling point without repeating.\n\nPitch:")
 
 def generate_product_pitch(product_description):
     """Generate a persuasive pitch for the product using LLM."""
     try:
         if not product_description:
-            return "No product description available."
+            return NO_DESCRIPTION
         
-        # Get thread-specific LLM instance
         llm = get_llm()
-            
-        prompt = (f"The following is a product description extracted from an HTML page:\n\n"
-          f"{product_description}\n\n"
-          f"Based on this description, provide a single, concise, and compelling pitch in one sentence. "
-          f"Focus on the key benefit and selling point without repeating.\n\nPitch:")
-
-        response = llm.invoke(prompt)
+        with span("pitch"):
+            response = llm.invoke(pitch_prompt(product_description))
         
         if not response or not isinstance(response, str):
-            return "Unable to generate product pitch at this time."
+            return PITCH_UNAVAILABLE
             
         return response.strip()
     except Exception as e:
         print(f"Error generating pitch: {str(e)}")
-        return "Error generating product pitch."
-    finally:
-        # Cleanup after generating pitch
-        cleanup_llm()
-        gc.collect()
+        return PITCH_ERROR
+
+async def agenerate_product_pitch(product_description):
+    """Async variant of generate_product_pitch for the ASGI server."""
+    try:
+        if not product_description:
+            return NO_DESCRIPTION
+
+        with span("pitch"):
+            response = await get_llm().ainvoke(pitch_prompt(product_description))
+
+        if not response or not isinstance(response, str):
+            return PITCH_UNAVAILABLE
+
+        return response.strip()
+    except Exception as e:
+        print(f"Error generating pitch: {str(e)}")
+        return PITCH_ERROR
+
+def generate_product_pitches(product_descriptions):
+    """Generate pitches for several products with a single LLM call.
+
+    Returns one pitch per description, None for any item the response did not cover.
+    """
+    try:
+        cleaned = [clean_description(description) for description in product_descriptions]
+        with span("pitch_batch"):
+            response = get_batch_llm().invoke(build_batch_prompt(cleaned))
+        return parse_batch_response(response, len(product_descriptions))
+    except Exception as e:
+        print(f"Error generating batch pitches: {str(e)}")
+        return [None] * len(product_descriptions)
 
-def find_products_with_url(category_id, size_id, color_id):
-    """Find products with their URL keys."""
-    if not category_id or not size_id or not color_id:
-        return []
+# Runs the pitches of one result set in parallel, falling back to the description on timeout.
+# Generated pitches are persisted, so a product is only pitched again when its description changes.
+# PITCH_MODE=batch sends each result set to the LLM as one prompt instead of one per product.
+pitch_engine = PitchEngine(
+    generate_product_pitch,
+    generate_batch=generate_product_pitches,
+    timeout=PITCH_TIMEOUT,
+    store=PitchStore(),
+    model_name=PITCH_MODEL,
+    uncacheable=(NO_DESCRIPTION, PITCH_UNAVAILABLE, PITCH_ERROR)
+)
 
+@app.cli.command("warm-pitches")
+def warm_pitches():
+    """Pre-generate pitches for all active products: flask --app app warm-pitches"""
     conn = get_db_connection()
-    cur = conn.cursor(dictionary=True)
+    cur = None
     try:
-        query = """
-            SELECT DISTINCT 
-                pf.name,
-                pf.short_description,
-                pf.url_key
+        cur = conn.cursor(dictionary=True)
+        cur.execute("""
+            SELECT DISTINCT pf.product_id, pf.short_description, pf.url_key
             FROM ecommerce.product_flat pf
-            JOIN ecommerce.product_categories pc 
-                ON pf.product_id = pc.product_id
-            JOIN ecommerce.product_attribute_values color_attr 
-                ON pf.product_id = color_attr.product_id 
-                AND color_attr.attribute_id = 23
-                AND color_attr.integer_value = %s
-            JOIN ecommerce.product_attribute_values size_attr 
-                ON pf.product_id = size_attr.product_id 
-                AND size_attr.attribute_id = 24
-                AND size_attr.integer_value = %s
-            WHERE pc.category_id = %s 
-                AND pf.status = 1
-            LIMIT 5;  -- Limit number of products to process
-        """
-        cur.execute(query, (color_id, size_id, category_id))
-        return cur.fetchall()
-    except Exception as e:
-        print(f"Error finding products: {str(e)}")
-        return []
+            WHERE pf.status = 1;
+        """)
+        products = cur.fetchall()
     finally:
-        cur.close()
+        if cur is not None:
+            cur.close()
         conn.close()
+    generated = pitch_engine.warm(products)
+    print(f"Generated {generated} new pitches for {len(products)} active products")
+
+# Identical questions and searches arriving together share one computation
+faq_flight = SingleFlight("faq", timeout=float(os.getenv("FAQ_FLIGHT_TIMEOUT", "30")))
+products_flight = SingleFlight("find_products", timeout=float(os.getenv("PRODUCTS_FLIGHT_TIMEOUT", "10")))
+
+def open_session(data):
+    """(session_id, history, error) for an FAQ request.
+
+    {"start_session": true} starts a conversation under a new server-issued id; a
+    "session_id" must be one the server issued and that has not expired.
+    """
+    store = get_session_store()
+    if data.get('start_session'):
+        session_id = store.create()
+        return session_id, store.history(session_id), None
+    session_id = data.get('session_id')
+    if session_id is None:
+        return None, None, None
+    history = store.history(session_id)
+    if history is None:
+        return None, None, "Unknown or expired session_id. Start a new one with start_session."
+    return session_id, history, None
+
+def answer_faq(user_input, session_id=None, history=None):
+    """Answer an FAQ question; with a session_id the exchange joins that conversation's history."""
+    if history:
+        # A follow-up's answer depends on its conversation: it is not shared with other askers
+        response = faq_main(user_input, history=history)
+    else:
+        response = faq_flight.do(normalize_question(user_input), lambda: faq_main(user_input))
+    if session_id and "answer" in response:
+        get_session_store().append(session_id, user_input, response["answer"])
+    return response
+
+def products_key(category_ids, size_ids, color_ids, cursor, page_size):
+    return (tuple(sorted(as_ids(category_ids))), tuple(sorted(as_ids(size_ids))), tuple(sorted(as_ids(color_ids))),
+            int(cursor or 0), clamp_page_size(page_size))
+
+def find_products_with_url(category_ids, size_ids, color_ids, cursor=None, page_size=None):
+    """Find one page of products with their URL keys; returns (products, next_cursor).
+
+    Each facet takes one id or a list of ids; products matching any of them qualify.
+    """
+    if not category_ids or not size_ids or not color_ids:
+        return [], None
+
+    try:
+        return products_flight.do(
+            products_key(category_ids, size_ids, color_ids, cursor, page_size),
+            lambda: search_products(category_ids, size_ids, color_ids, cursor=cursor, page_size=page_size))
+    except Exception as e:
+        print(f"Error finding products: {str(e)}")
+        return [], None
+
+@app.route('/api/faq/reload', methods=['POST'])
+def faq_reload():
+    return jsonify(reload_index())
+
+@app.route('/api/faq/cache_stats', methods=['GET'])
+def faq_cache_stats():
+    return jsonify(answer_cache.stats())
+
+@app.route('/api/faq/retrieval_stats', methods=['GET'])
+def faq_retrieval_stats():
+    return jsonify(retrieval_policy.stats())
+
+@app.route('/api/sessions/stats', methods=['GET'])
+def session_stats():
+    return jsonify(get_session_store().stats())
+
+@app.route('/api/sessions/<session_id>', methods=['GET', 'DELETE'])
+def session_route(session_id):
+    """Inspect or end a conversation; only its holder knows the (server-issued, unguessable) id."""
+    store = get_session_store()
+    session = store.history(session_id)
+    if session is None:
+        return jsonify({"content": "Unknown session."}), 404
+    if request.method == 'DELETE':
+        return jsonify({"deleted": store.clear(session_id)})
+    return jsonify({**session.as_dict(), "bytes": session.nbytes()})
+
+@app.route('/api/embed/stats', methods=['GET'])
+def embed_stats():
+    return jsonify(batcher_stats())
+
+@app.route('/api/db/pool_stats', methods=['GET'])
+def db_pool_stats():
+    return jsonify(get_pool().stats())
+
+def catalog_response(kind):
+    """Serve a cached catalog lookup, answering 304 when the client already has this version."""
+    data, etag = catalog.get(kind)
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = jsonify({"content": data})
+    response.set_etag(etag)
+    return response
+
+@app.route('/api/catalog/<kind>', methods=['GET'])
+def catalog_lookup(kind):
+    if kind not in catalog.loaders:
+        return jsonify({"content": "Unknown catalog lookup."}), 404
+    return catalog_response(kind)
+
+@app.route('/api/catalog/invalidate', methods=['POST'])
+def catalog_invalidate():
+    kind = (request.get_json(silent=True) or {}).get('kind')
+    if kind and kind not in catalog.loaders:
+        return jsonify({"content": "Unknown catalog lookup."}), 404
+    return jsonify({"etags": catalog.invalidate(kind)})
+
+@app.route('/api/single_flight/stats', methods=['GET'])
+def single_flight_stats_route():
+    return jsonify(single_flight_stats())
+
+@app.route('/api/process/memory', methods=['GET'])
+def process_memory_route():
+    """This worker's RSS/USS/PSS; `python prefork.py report` covers all workers at once."""
+    import psutil
+    from prefork import process_memory
+    return jsonify(process_memory(psutil.Process()))
+
+@app.route('/api/llm/stats', methods=['GET'])
+def llm_stats():
+    return jsonify(llm_registry.stats())
+
+# name -> (warm-up function, readiness check); each warm-up loads what a first request would wait for
+SUBSYSTEMS = {
+    "faq": (faq_warm_up, faq_is_ready),
+    "catalog": (lambda: {kind: catalog.get(kind)[1] for kind in catalog.loaders}, catalog.loaded),
+    "facets": (get_facet_index, lambda: facet_index.ready),
+    "pitch": (lambda: get_llm().invoke("Reply with OK."), lambda: llm_registry.loaded("pitch")),
+}
+
+def warm_subsystems(names):
+    """Warm the named subsystems in order; returns {name: {"seconds": ..., "error": ...}}."""
+    results = {}
+    for name in names:
+        start_time = time.time()
+        try:
+            SUBSYSTEMS[name][0]()
+            results[name] = {"seconds": round(time.time() - start_time, 3)}
+        except Exception as e:
+            print(f"Error warming up {name}: {str(e)}")
+            results[name] = {"seconds": round(time.time() - start_time, 3), "error": str(e)}
+    return results
+
+def readiness(names):
+    return {name: bool(SUBSYSTEMS[name][1]()) for name in names}
+
+# Subsystems this worker warms in the background at startup and that /readyz waits for,
+# e.g. WARMUP_SUBSYSTEMS=catalog,facets,pitch for a shopping-only worker
+WARMUP_SUBSYSTEMS = [name for name in os.getenv("WARMUP_SUBSYSTEMS", "").split(",") if name in SUBSYSTEMS]
+
+def start_background_tasks():
+    """Start the FAQ watcher and background warm-up; threads do not survive a fork, so
+    pre-forked workers call this after forking (see gunicorn.conf.py)."""
+    # Pre-forked workers share the master's index files; several watchers would rewrite
+    # them concurrently, so FAQ changes there take a restart instead
+    if os.getenv("FAQ_WATCH") == "1" and os.getenv("PREFORK") != "1":
+        get_index_manager().start_watcher()
+    if WARMUP_SUBSYSTEMS:
+        threading.Thread(target=warm_subsystems, args=(WARMUP_SUBSYSTEMS,), name="warmup", daemon=True).start()
+
+if os.getenv("PREFORK") != "1":
+    start_background_tasks()
+
+@app.route('/api/warmup', methods=['POST'])
+def warmup():
+    """Load subsystems now instead of on first use: {"subsystems": ["faq", "pitch"]}, default all."""
+    names = (request.get_json(silent=True) or {}).get('subsystems') or list(SUBSYSTEMS)
+    unknown = [name for name in names if name not in SUBSYSTEMS]
+    if unknown:
+        return jsonify({"content": f"Unknown subsystems: {', '.join(unknown)}"}), 400
+    return jsonify({"warmed": warm_subsystems(names), "ready": readiness(names)})
+
+@app.route('/readyz', methods=['GET'])
+def readyz():
+    """200 once every WARMUP_SUBSYSTEMS entry is loaded, 503 before; lazy workers are always ready."""
+    status = readiness(WARMUP_SUBSYSTEMS)
+    ready = all(status.values())
+    return jsonify({"ready": ready, "subsystems": readiness(SUBSYSTEMS)}), 200 if ready else 503
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Per-stage latency histograms and p50/p95/p99 in the Prometheus text format."""
+    return Response(metrics.render_prometheus(), mimetype="text/plain; version=0.0.4")
+
+def parse_find_products(user_input):
+    """Parse 'find_products categories sizes colors' into ((category_ids, size_ids, color_ids), error).
+
+    Each facet is a comma-separated list of ids or names, e.g. 'find_products 3 m,l red,blue';
+    names are resolved through the catalog's normalized lookup table (synonyms, typos).
+    """
+    parts = user_input.split()
+    if len(parts) != 4:
+        return None, "Invalid input format. Expected: find_products category_id size_id color_id"
+    ids = []
+    for kind, value in zip(("categories", "sizes", "colors"), parts[1:]):
+        resolved, unknown = catalog.resolve_many(kind, value)
+        if unknown or not resolved:
+            return None, f"Unknown {kind}: {', '.join(unknown) or value}. Please provide valid IDs or names."
+        ids.append(resolved)
+    return tuple(ids), None
+
+def parse_page(data):
+    """Validate the request's 'cursor' and 'page_size' into ((cursor, page_size), error).
+
+    The cursor is the next_cursor of the previous page (0 or absent for the first one);
+    page_size defaults to the search default and is capped at its maximum.
+    """
+    values = []
+    for name, default, minimum in (("cursor", 0, 0), ("page_size", None, 1)):
+        value = data.get(name)
+        if value is None or value == "":
+            values.append(default)
+            continue
+        if isinstance(value, bool) or not (isinstance(value, int) or (isinstance(value, str) and value.isdigit())) \
+                or int(value) < minimum:
+            return None, f"Invalid {name}: {value!r}. Expected an integer of at least {minimum}."
+        values.append(int(value))
+    return (values[0], clamp_page_size(values[1])), None
+
+def recommendation(product, pitch, base_url):
+    product_url = f"{base_url.rstrip('/')}/{product.get('url_key', '').lstrip('/')}"
+    return {
+        "name": product.get('name', 'Unknown Product'),
+        "description": product.get('short_description', ''),
+        "recommendation": pitch,
+        "url": product_url
+    }
 
 @app.route('/api/chat', methods=['POST'])
 def chat():
     data = request.json
+    with track_request() as timings:
+        response = chat_response(data)
+    # Opt-in per-stage breakdown: {"timings": true} in the request body, or METRICS_TIMINGS=1
+    if timings_requested(data) and response.is_json:
+        payload = response.get_json()
+        payload["timings"] = timings.as_dict()
+        response.set_data(json.dumps(payload))
+    return response
+
+def chat_response(data):
     choice = data.get('choice')
     user_input = data.get('input', '').strip()
     base_url = data.get('base_url', 'http://kea.mywire.org:5500/')
 
     try:
         if choice == '1':  # FAQ Assistant
-            response = faq_main(user_input)
-            return jsonify({
+            session_id, history, error = open_session(data)
+            if error:
+                return jsonify({"content": error})
+            response = answer_faq(user_input, session_id, history)
+            payload = {
                 "content": response.get("answer", "Sorry, I couldn't find an answer."),
+                "products": response.get("products", []),
                 "processing_time": response.get("processing_time", 0),
-            })
+                "cache": response.get("cache", "miss"),
+            }
+            if session_id:
+                payload["session_id"] = session_id
+            return jsonify(payload)
 
         elif choice == '2':  # Shopping Assistant
             if user_input == 'get_categories':
-                categories = get_available_categories()
-                return jsonify({"content": categories})
+                return catalog_response("categories")
 
             elif user_input == 'get_sizes':
-                sizes = get_available_sizes()
-                return jsonify({"content": sizes})
+                return catalog_response("sizes")
 
             elif user_input == 'get_colors':
-                colors = get_available_colors()
-                return jsonify({"content": colors})
+                return catalog_response("colors")
 
             elif user_input.startswith('find_products'):
                 try:
-                    parts = user_input.split()
-                    if len(parts) != 4:
-                        return jsonify({"content": "Invalid input format. Expected: find_products category_id size_id color_id"})
-                    
-                    _, category, size, color = parts
-                    category_id = int(category)
-                    size_id = int(size)
-                    color_id = int(color)
+                    ids, error = parse_find_products(user_input)
+                    if not error:
+                        page, error = parse_page(data)
+                    if error:
+                        return jsonify({"content": error})
                     
-                    products = find_products_with_url(category_id, size_id, color_id)
+                    products, next_cursor = find_products_with_url(*ids, *page)
                     
                     if not products:
-                        return jsonify({"content": []})
-
-                    recommended_products = []
-                    for product in products:
-                        if not product.get('short_description'):
-                            continue
-                            
-                        pitch = generate_product_pitch(product.get('short_description'))
-                        product_url = f"{base_url.rstrip('/')}/{product.get('url_key', '').lstrip('/')}"
-                        
-                        recommended_products.append({
-                            "name": product.get('name', 'Unknown Product'),
-                            "description": product.get('short_description', ''),
-                            "recommendation": pitch,
-                            "url": product_url
-                        })
-                      
-                        
-                        # Force garbage collection after each product
-                        gc.collect()
-
-                    return jsonify({"content": recommended_products})
+                        return jsonify({"content": [], "next_cursor": None})
+
+                    products = [product for product in products if product.get('short_description')]
+                    pitches = pitch_engine.pitch_all(products)
+                    # Clients stay warm; they are only dropped if the host runs short of memory
+                    llm_registry.maybe_release()
+
+                    recommended_products = [
+                        recommendation(product, pitch, base_url)
+                        for product, pitch in zip(products, pitches)
+                    ]
+
+                    return jsonify({
+                        "content": recommended_products,
+                        "next_cursor": next_cursor,
+                        "facets": facet_summary(*ids),
+                    })
                     
-                except ValueError:
-                    return jsonify({"content": "Invalid ID format. Please provide numeric IDs."})
                 except Exception as e:
                     print(f"Error processing products: {str(e)}")
                     return jsonify({"content": f"Error processing products: {str(e)}"})
@@ -200,5 +470,78 @@ def chat():
         print(f"General error: {str(e)}")
         return jsonify({"content": f"Error: {str(e)}"})
 
+def sse(event, payload):
+    """Format one Server-Sent Event."""
+    return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+
+@app.route('/api/chat/stream', methods=['POST'])
+def chat_stream():
+    """Streaming variant of /api/chat.
+
+    FAQ answers arrive as `token` events while the model generates them; find_products
+    sends one `product` event per product (with its `index` in the result set) as soon
+    as its pitch is ready. Every other command is a single `message` event. The stream
+    always ends with a `done` event. FAQ questions take `start_session` / `session_id`
+    as on /api/chat.
+    """
+    data = request.json
+    choice = data.get('choice')
+    user_input = data.get('input', '').strip()
+    base_url = data.get('base_url', 'http://kea.mywire.org:5500/')
+
+    def events():
+        try:
+            if choice == '1':  # FAQ Assistant
+                session_id, history, error = open_session(data)
+                if error:
+                    yield sse("message", {"content": error})
+                    yield sse("done", {})
+                    return
+                store = get_session_store() if session_id else None
+                parts = []
+                for part in faq_stream(user_input, history=history):
+                    if "token" in part:
+                        parts.append(part["token"])
+                        yield sse("token", {"content": part["token"]})
+                    elif "error" in part:
+                        yield sse("message", {"content": part["error"]})
+                        yield sse("done", {})
+                    else:
+                        if store:
+                            store.append(session_id, user_input, "".join(parts))
+                            part = {**part, "session_id": session_id}
+                        yield sse("done", part)
+                return
+
+            if choice != '2':
+                yield sse("message", {"content": "Invalid choice. Please select a valid option."})
+            elif user_input in ('get_categories', 'get_sizes', 'get_colors'):
+                content, _ = catalog.get(user_input[len('get_'):])
+                yield sse("message", {"content": content})
+            elif user_input.startswith('find_products'):
+                ids, error = parse_find_products(user_input)
+                if not error:
+                    page, error = parse_page(data)
+                if error:
+                    yield sse("message", {"content": error})
+                else:
+                    products, next_cursor = find_products_with_url(*ids, *page)
+                    products = [product for product in products if product.get('short_description')]
+                    for index, pitch in pitch_engine.iter_pitches(products):
+                        yield sse("product", {"index": index, **recommendation(products[index], pitch, base_url)})
+                    llm_registry.maybe_release()
+                    yield sse("done", {"count": len(products), "next_cursor": next_cursor})
+                    return
+            else:
+                yield sse("message", {"content": "Invalid shopping assistant command."})
+            yield sse("done", {})
+        except Exception as e:
+            print(f"General error: {str(e)}")
+            yield sse("message", {"content": f"Error: {str(e)}"})
+            yield sse("done", {})
+
+    return Response(events(), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
 if __name__ == "__main__":
     app.run(host="0.0.0.0", port=5000, debug=True)
\ No newline at end of file
@@ -0,0 +1,223 @@
+"""Asyncio-native serving mode for the /api/chat contract.
+
+Run with an ASGI server, e.g. `hypercorn asgi_app:app --bind 0.0.0.0:5000`. MySQL is
+queried through an aiomysql pool and the LLMs through their async clients, so a request
+waiting on I/O holds no thread. Requests beyond CHAT_MAX_CONCURRENCY wait at most
+CHAT_QUEUE_TIMEOUT seconds for a slot and are then rejected with 429 and Retry-After.
+"""
+import os
+import json
+import asyncio
+from quart import Quart, request, jsonify, Response
+from quart_cors import cors
+import app as flask_app
+from FAQ import amain as faq_amain
+from Shopping_assistant import catalog
+import product_search
+from metrics import metrics, span, track_request, timings_requested
+from single_flight import AsyncSingleFlight, normalize_question
+from sessions import get_session_store
+
+app = cors(Quart(__name__))
+
+MAX_CONCURRENCY = int(os.getenv("CHAT_MAX_CONCURRENCY", "200"))
+QUEUE_TIMEOUT = float(os.getenv("CHAT_QUEUE_TIMEOUT", "0.5"))
+RETRY_AFTER = os.getenv("CHAT_RETRY_AFTER", "1")
+
+_slots = None
+_mysql_pool = None
+
+faq_flight = AsyncSingleFlight("faq_async", timeout=float(os.getenv("FAQ_FLIGHT_TIMEOUT", "30")))
+products_flight = AsyncSingleFlight("find_products_async", timeout=float(os.getenv("PRODUCTS_FLIGHT_TIMEOUT", "10")))
+
+
+@app.before_serving
+async def startup():
+    global _slots, _mysql_pool
+    _slots = asyncio.Semaphore(MAX_CONCURRENCY)
+    # The SQLite stand-in has no async driver; it keeps using the threaded pool
+    if os.getenv("MYSQL_FAKE") != "1":
+        import aiomysql
+        _mysql_pool = await aiomysql.create_pool(
+            host=os.getenv("MYSQL_HOST"),
+            user=os.getenv("MYSQL_USER"),
+            password=os.getenv("MYSQL_PASSWORD"),
+            db=os.getenv("MYSQL_DATABASE"),
+            maxsize=int(os.getenv("MYSQL_POOL_SIZE", "5")),
+            pool_recycle=int(float(os.getenv("MYSQL_POOL_RECYCLE", "1800"))),
+            autocommit=True
+        )
+
+
+@app.after_serving
+async def shutdown():
+    if _mysql_pool is not None:
+        _mysql_pool.close()
+        await _mysql_pool.wait_closed()
+
+
+async def _execute(query, params):
+    import aiomysql
+    async with _mysql_pool.acquire() as conn:
+        async with conn.cursor(aiomysql.DictCursor) as cur:
+            with span("db_query"):
+                await cur.execute(query, params)
+                return await cur.fetchall()
+
+
+async def find_products_with_url(category_ids, size_ids, color_ids, cursor=None, page_size=None):
+    """Async variant of app.find_products_with_url; returns (products, next_cursor).
+
+    Identical searches in flight at the same time share one lookup.
+    """
+    return await products_flight.do(
+        flask_app.products_key(category_ids, size_ids, color_ids, cursor, page_size),
+        lambda: _find_products_with_url(category_ids, size_ids, color_ids, cursor, page_size))
+
+
+async def _find_products_with_url(category_ids, size_ids, color_ids, cursor, page_size):
+    if _mysql_pool is None:
+        return await asyncio.to_thread(flask_app.find_products_with_url,
+                                       category_ids, size_ids, color_ids, cursor, page_size)
+    if not category_ids or not size_ids or not color_ids:
+        return [], None
+
+    try:
+        page_size = product_search.clamp_page_size(page_size)
+        index = await asyncio.to_thread(product_search.get_facet_index)
+        if index is not None:
+            ids, next_cursor = product_search.index_page(index, category_ids, size_ids, color_ids, cursor, page_size)
+        else:
+            rows = await _execute(*product_search.id_query(category_ids, size_ids, color_ids, cursor, page_size))
+            ids, next_cursor = product_search.paginate(rows, page_size)
+        if not ids:
+            return [], None
+        query, params = product_search.projection_query(ids)
+        return product_search.order_by_ids(await _execute(query, params), ids), next_cursor
+    except Exception as e:
+        print(f"Error finding products: {str(e)}")
+        return [], None
+
+
+async def catalog_response(kind):
+    data, etag = await asyncio.to_thread(catalog.get, kind)
+    if request.if_none_match.contains(etag):
+        response = Response("", status=304)
+    else:
+        response = jsonify({"content": data})
+    response.set_etag(etag)
+    return response
+
+
+async def handle_chat(data):
+    choice = data.get('choice')
+    user_input = data.get('input', '').strip()
+    base_url = data.get('base_url', 'http://kea.mywire.org:5500/')
+
+    if choice == '1':  # FAQ Assistant
+        session_id, history, error = await asyncio.to_thread(flask_app.open_session, data)
+        if error:
+            return jsonify({"content": error})
+        store = get_session_store() if session_id else None
+        if history:
+            # A follow-up's answer depends on its conversation: it is not shared with other askers
+            response = await faq_amain(user_input, history=history)
+        else:
+            response = await faq_flight.do(normalize_question(user_input), lambda: faq_amain(user_input))
+        payload = {
+            "content": response.get("answer", "Sorry, I couldn't find an answer."),
+            "products": response.get("products", []),
+            "processing_time": response.get("processing_time", 0),
+            "cache": response.get("cache", "miss"),
+        }
+        if store:
+            if "answer" in response:
+                await asyncio.to_thread(store.append, session_id, user_input, response["answer"])
+            payload["session_id"] = session_id
+        return jsonify(payload)
+
+    elif choice == '2':  # Shopping Assistant
+        if user_input in ('get_categories', 'get_sizes', 'get_colors'):
+            return await catalog_response(user_input[len('get_'):])
+
+        elif user_input.startswith('find_products'):
+            try:
+                # Resolving names loads the catalog from MySQL on first use and after a failed load
+                ids, error = await asyncio.to_thread(flask_app.parse_find_products, user_input)
+                if not error:
+                    page, error = flask_app.parse_page(data)
+                if error:
+                    return jsonify({"content": error})
+
+                products, next_cursor = await find_products_with_url(*ids, *page)
+                products = [product for product in products if product.get('short_description')]
+                if not products:
+                    return jsonify({"content": [], "next_cursor": None})
+
+                pitches = await flask_app.pitch_engine.apitch_all(products, flask_app.agenerate_product_pitch)
+                facets = await asyncio.to_thread(product_search.facet_summary, *ids)
+                return jsonify({"content": [
+                    flask_app.recommendation(product, pitch, base_url)
+                    for product, pitch in zip(products, pitches)
+                ], "next_cursor": next_cursor, "facets": facets})
+            except Exception as e:
+                print(f"Error processing products: {str(e)}")
+                return jsonify({"content": f"Error processing products: {str(e)}"})
+
+        else:
+            return jsonify({"content": "Invalid shopping assistant command."})
+
+    else:
+        return jsonify({"content": "Invalid choice. Please select a valid option."})
+
+
+@app.route('/api/chat', methods=['POST'])
+async def chat():
+    try:
+        await asyncio.wait_for(_slots.acquire(), QUEUE_TIMEOUT)
+    except asyncio.TimeoutError:
+        response = jsonify({"content": "Server is busy, please retry shortly."})
+        response.status_code = 429
+        response.headers["Retry-After"] = RETRY_AFTER
+        return response
+
+    try:
+        data = await request.get_json()
+        with track_request() as timings:
+            response = await handle_chat(data)
+        if timings_requested(data) and response.is_json:
+            payload = await response.get_json()
+            payload["timings"] = timings.as_dict()
+            response.set_data(json.dumps(payload))
+        return response
+    except Exception as e:
+        print(f"General error: {str(e)}")
+        return jsonify({"content": f"Error: {str(e)}"})
+    finally:
+        _slots.release()
+
+
+@app.route('/metrics', methods=['GET'])
+async def prometheus_metrics():
+    return Response(metrics.render_prometheus(), mimetype="text/plain; version=0.0.4")
+
+
+@app.route('/api/warmup', methods=['POST'])
+async def warmup():
+    names = ((await request.get_json(silent=True)) or {}).get('subsystems') or list(flask_app.SUBSYSTEMS)
+    unknown = [name for name in names if name not in flask_app.SUBSYSTEMS]
+    if unknown:
+        return jsonify({"content": f"Unknown subsystems: {', '.join(unknown)}"}), 400
+    warmed = await asyncio.to_thread(flask_app.warm_subsystems, names)
+    return jsonify({"warmed": warmed, "ready": flask_app.readiness(names)})
+
+
+@app.route('/readyz', methods=['GET'])
+async def readyz():
+    ready = all(flask_app.readiness(flask_app.WARMUP_SUBSYSTEMS).values())
+    return jsonify({"ready": ready, "subsystems": flask_app.readiness(flask_app.SUBSYSTEMS)}), 200 if ready else 503
+
+
+@app.route('/api/single_flight/stats', methods=['GET'])
+async def single_flight_stats():
+    return jsonify(flask_app.single_flight_stats())
@@ -0,0 +1,113 @@
+"""Benchmark: per-request embed_query versus the EmbedBatcher micro-batching dispatcher.
+
+    python benchmarks/bench_embed_batching.py [--concurrency 1,4,16,64] [--requests 512]
+                                              [--window-ms 3] [--max-batch 32] [--simulated]
+
+Uses all-MiniLM-L6-v2 through HuggingFaceEmbeddings when it is installed. --simulated (or a
+missing model) uses a stand-in whose forward pass costs --pass-ms plus --item-ms per text,
+the cost shape that makes batching pay off on CPU.
+"""
+import os
+import sys
+import time
+import argparse
+import threading
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from embed_batcher import EmbedBatcher
+
+QUESTIONS = [
+    "How long does shipping take?", "What is your return policy?", "Do you ship internationally?",
+    "How can I track my order?", "Can I change my delivery address?", "What payment methods do you accept?",
+    "How do I contact support?", "Do you offer gift cards?", "Are there any discounts for students?",
+    "How do I reset my password?", "What sizes do your shirts come in?", "Is my payment information secure?",
+]
+
+
+class SimulatedEmbeddings:
+    """Fixed cost per forward pass plus a smaller cost per text, like a transformer on CPU.
+
+    Passes run one at a time, as torch already spreads a single pass over all cores.
+    """
+
+    def __init__(self, pass_ms, item_ms, dimension=384):
+        self.pass_seconds = pass_ms / 1000
+        self.item_seconds = item_ms / 1000
+        self.dimension = dimension
+        self._device = threading.Lock()
+
+    def embed_documents(self, texts):
+        with self._device:
+            time.sleep(self.pass_seconds + self.item_seconds * len(texts))
+        return [[float(len(text))] * self.dimension for text in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+def load_embeddings(args):
+    if not args.simulated:
+        try:
+            from langchain_huggingface import HuggingFaceEmbeddings
+            embeddings = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
+            embeddings.embed_query("warm up")
+            return embeddings, "all-MiniLM-L6-v2"
+        except Exception as e:
+            print(f"Error loading all-MiniLM-L6-v2, using the simulated model: {str(e)}")
+    return SimulatedEmbeddings(args.pass_ms, args.item_ms), f"simulated ({args.pass_ms} ms/pass + {args.item_ms} ms/item)"
+
+
+def run(embed, concurrency, requests):
+    latencies = []
+    lock = threading.Lock()
+    per_thread = requests // concurrency
+
+    def worker(offset):
+        for index in range(per_thread):
+            text = f"{QUESTIONS[(offset + index) % len(QUESTIONS)]} #{offset}-{index}"
+            start = time.perf_counter()
+            embed(text)
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+
+    threads = [threading.Thread(target=worker, args=(offset,)) for offset in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - start
+    p50, p99 = np.percentile(latencies, [50, 99]) * 1000
+    return len(latencies) / wall, p50, p99
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", default="1,4,16,64")
+    parser.add_argument("--requests", type=int, default=512)
+    parser.add_argument("--window-ms", type=float, default=3)
+    parser.add_argument("--max-batch", type=int, default=32)
+    parser.add_argument("--simulated", action="store_true")
+    parser.add_argument("--pass-ms", type=float, default=8)
+    parser.add_argument("--item-ms", type=float, default=0.5)
+    args = parser.parse_args()
+
+    embeddings, model = load_embeddings(args)
+    print(f"model: {model}, window {args.window_ms} ms, max batch {args.max_batch}\n")
+    print(f"{'conc':>5} | {'direct rps':>10} {'p50 ms':>7} {'p99 ms':>7} | "
+          f"{'batched rps':>11} {'p50 ms':>7} {'p99 ms':>7} {'batch':>6} | {'speedup':>7}")
+    for concurrency in (int(level) for level in args.concurrency.split(",")):
+        direct = run(embeddings.embed_query, concurrency, args.requests)
+        batcher = EmbedBatcher(embeddings, window_ms=args.window_ms, max_batch=args.max_batch)
+        batched = run(batcher.embed_query, concurrency, args.requests)
+        mean_batch = batcher.stats()["mean_batch_size"]
+        print(f"{concurrency:>5} | {direct[0]:>10.0f} {direct[1]:>7.1f} {direct[2]:>7.1f} | "
+              f"{batched[0]:>11.0f} {batched[1]:>7.1f} {batched[2]:>7.1f} {mean_batch:>6.1f} | "
+              f"{batched[0] / direct[0]:>6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
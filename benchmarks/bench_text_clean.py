@@ -0,0 +1,75 @@
+"""Micro-benchmark: text_clean versus the BeautifulSoup cleaning it replaced.
+
+    python benchmarks/bench_text_clean.py [iterations]
+
+Cleans the seeded fake catalog's descriptions (plus a few heavier HTML samples) with
+BeautifulSoup(html, "html.parser").get_text, with text_clean.html_to_text, and with the
+memoized clean_description as it runs on repeated requests.
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from text_clean import html_to_text, DescriptionCleaner
+
+SAMPLES = [
+    "<p>Soft <b>organic</b> cotton tee with a relaxed fit.</p>",
+    "<div class=\"desc\"><h2>Trail Runner</h2><ul><li>Breathable mesh upper</li><li>Grippy outsole</li>"
+    "<li>Cushioned &amp; light</li></ul><p>Made for long miles &mdash; wet or dry.</p></div>",
+    "<p>" + "Premium denim woven for comfort and durability. " * 40 + "</p>"
+    "<script>var tracking = {sku: 1};</script><style>.x{color:red}</style>",
+]
+
+
+def descriptions():
+    os.environ.setdefault("MYSQL_FAKE", "1")
+    try:
+        from db_pool import get_db_connection
+        conn = get_db_connection()
+        cur = conn.cursor(dictionary=True)
+        cur.execute("SELECT pf.short_description, pf.description FROM ecommerce.product_flat pf")
+        rows = cur.fetchall()
+        cur.close()
+        conn.close()
+        texts = [value for row in rows for value in row.values() if value]
+    except Exception as e:
+        print(f"Error loading catalog descriptions, using samples only: {str(e)}")
+        texts = []
+    return texts + SAMPLES * 20
+
+
+def timed(label, function, texts, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        for text in texts:
+            function(text)
+    elapsed = time.perf_counter() - start
+    per_item = elapsed / (iterations * len(texts)) * 1e6
+    print(f"{label:<28} {elapsed:8.3f}s  {per_item:8.1f} us/description")
+    return per_item
+
+
+def main(iterations=20):
+    texts = descriptions()
+    print(f"{len(texts)} descriptions x {iterations} iterations\n")
+
+    try:
+        from bs4 import BeautifulSoup
+        baseline = timed("BeautifulSoup get_text", lambda html: BeautifulSoup(html, "html.parser").get_text(separator=" "),
+                         texts, iterations)
+    except ImportError:
+        print("BeautifulSoup not installed, skipping the baseline")
+        baseline = None
+
+    parsed = timed("text_clean.html_to_text", html_to_text, texts, iterations)
+    cleaner = DescriptionCleaner()
+    memoized = timed("clean_description (memo)", cleaner.clean, texts, iterations)
+    print(f"\ncache: {cleaner.stats()}")
+    if baseline:
+        print(f"speedup: {baseline / parsed:.1f}x parsing, {baseline / memoized:.1f}x with the memo")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20)
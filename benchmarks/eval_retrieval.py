@@ -0,0 +1,134 @@
+"""Offline evaluation of FAQ retrieval: fixed top-k versus the adaptive RetrievalPolicy, per chunking profile.
+
+    python benchmarks/eval_retrieval.py [--profiles default,compact,fine] [--questions FILE]
+                                        [--min-score 0.2] [--margin 0.25] [--budget 800] [--llm]
+
+Every question in retrieval_questions.jsonl lists the facts ("expect") a good answer needs;
+out-of-scope questions list none. For each profile the FAQ index is built in a scratch
+directory and every question is retrieved both ways. Reported per configuration:
+
+    support     in-scope questions whose context contains every expected fact
+    skipped     out-of-scope questions answered without context
+    ctx / prompt  mean estimated tokens of the context and of the whole prompt
+
+--llm also runs the answer chain (LLM_BACKEND picks Groq or the local stand-in) and adds the
+mean LLM latency and the share of in-scope answers that contain every expected fact.
+EMBEDDINGS_BACKEND=fake runs without downloading all-MiniLM-L6-v2; its scores are not those
+of the real model, so tune the thresholds with the real one.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import FAQ
+from faq_index import FAQIndexManager
+from retrieval import CHUNKING_PROFILES, RetrievalPolicy, chunking_profile, scored_search
+from text_clean import estimate_tokens
+
+
+def load_questions(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def supported(text, expect):
+    return all(fact.lower() in text.lower() for fact in expect)
+
+
+def evaluate(vectorstore, questions, policy, run_llm):
+    rows = []
+    for item in questions:
+        query_vector = FAQ.get_embeddings().embed_query(item["question"])
+        scored = scored_search(vectorstore, query_vector, policy.max_k)
+        context = policy.select(scored)
+        context_text = "\n\n".join(document.page_content for document in context)
+        prompt = FAQ.PROMPT_TEMPLATE.format(context=context_text, input=item["question"], history="")
+        row = {"in_scope": bool(item["expect"]), "support": supported(context_text, item["expect"]),
+               "skipped": not context, "context_tokens": estimate_tokens(context_text),
+               "prompt_tokens": estimate_tokens(prompt)}
+        if run_llm:
+            start = time.perf_counter()
+            answer = FAQ.get_document_chain().invoke({"input": item["question"], "context": context, "history": ""})
+            row["llm_seconds"] = time.perf_counter() - start
+            row["answer_ok"] = supported(answer, item["expect"])
+        rows.append(row)
+    return rows
+
+
+def summarize(rows, run_llm):
+    in_scope = [row for row in rows if row["in_scope"]]
+    out_of_scope = [row for row in rows if not row["in_scope"]]
+    summary = {
+        "support": np.mean([row["support"] for row in in_scope]) if in_scope else 0.0,
+        "skipped": np.mean([row["skipped"] for row in out_of_scope]) if out_of_scope else 0.0,
+        "context_tokens": np.mean([row["context_tokens"] for row in rows]),
+        "prompt_tokens": np.mean([row["prompt_tokens"] for row in rows]),
+    }
+    if run_llm:
+        summary["llm_ms"] = np.mean([row["llm_seconds"] for row in rows]) * 1000
+        summary["answer_ok"] = np.mean([row["answer_ok"] for row in in_scope]) if in_scope else 0.0
+    return {name: float(value) for name, value in summary.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--profiles", default=",".join(CHUNKING_PROFILES))
+    parser.add_argument("--questions", default=os.path.join(ROOT, "benchmarks", "retrieval_questions.jsonl"))
+    parser.add_argument("--max-k", type=int, default=4)
+    parser.add_argument("--min-score", type=float, default=None)
+    parser.add_argument("--margin", type=float, default=None)
+    parser.add_argument("--budget", type=int, default=None)
+    parser.add_argument("--llm", action="store_true")
+    parser.add_argument("--json")
+    args = parser.parse_args()
+
+    questions = load_questions(args.questions)
+    scratch = tempfile.mkdtemp(prefix="retrieval-eval-")
+    policies = {
+        "fixed": RetrievalPolicy(max_k=args.max_k, adaptive=False),
+        "adaptive": RetrievalPolicy(max_k=args.max_k, min_score=args.min_score, margin=args.margin,
+                                    token_budget=args.budget, adaptive=True),
+    }
+    adaptive = policies["adaptive"]
+    print(f"{len(questions)} questions; adaptive: min score {adaptive.min_score}, margin {adaptive.margin}, "
+          f"budget {adaptive.token_budget} tokens, max k {adaptive.max_k}\n")
+    header = f"{'profile':<8} {'chunks':>6} {'mode':<9} {'support':>7} {'skipped':>7} {'ctx':>6} {'prompt':>6}"
+    print(header + (f" {'llm ms':>7} {'answer':>6}" if args.llm else ""))
+
+    results = []
+    try:
+        for profile in args.profiles.split(","):
+            chunk_size, chunk_overlap = chunking_profile(profile)
+            manager = FAQIndexManager(os.path.join(ROOT, "scalixity_faq_data.txt"), FAQ.get_embeddings(),
+                                      index_dir=os.path.join(scratch, profile), chunk_size=chunk_size,
+                                      chunk_overlap=chunk_overlap, use_mmap=False)
+            vectorstore = manager.get_vectorstore()
+            chunks = len(vectorstore.index_to_docstore_id) if hasattr(vectorstore, "index_to_docstore_id") \
+                else len(vectorstore.ids)
+            for mode, policy in policies.items():
+                summary = summarize(evaluate(vectorstore, questions, policy, args.llm), args.llm)
+                results.append({"profile": profile, "chunk_size": chunk_size, "chunk_overlap": chunk_overlap,
+                                "mode": mode, **summary})
+                line = (f"{profile:<8} {chunks:>6} {mode:<9} {summary['support']:>7.2f} {summary['skipped']:>7.2f} "
+                        f"{summary['context_tokens']:>6.0f} {summary['prompt_tokens']:>6.0f}")
+                if args.llm:
+                    line += f" {summary['llm_ms']:>7.0f} {summary['answer_ok']:>6.2f}"
+                print(line)
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
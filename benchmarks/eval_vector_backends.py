@@ -0,0 +1,126 @@
+"""Recall versus latency of each vector index backend, measured against exact flat search.
+
+    python benchmarks/eval_vector_backends.py [--backends flat,ivf,hnsw,sq8] [--k 4]
+                                              [--size 12000] [--queries 500]
+                                              [--vectors FILE.npy | --product-index DIR]
+                                              [--nprobe 1,4,8,16] [--ef-search 16,32,64,128] [--json OUT]
+
+The corpus is clustered synthetic 384-dimensional vectors by default, a saved (n, dim) .npy
+matrix with --vectors, or the vectors of a flat product index built by `product_index.py
+build`. --queries of them are held out of the index and used as queries; the true top k of
+each comes from flat search. IVF is measured at every --nprobe, HNSW at every
+--ef-search. Latency is per single-query search, the way the chat endpoints search.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import numpy as np
+import faiss
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from vector_backends import BACKENDS, build_index, configure_search, index_spec
+
+
+def synthetic_vectors(size, dim, seed):
+    """Points scattered around a few hundred topics, closer to text embeddings than uniform noise."""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((max(1, size // 50), dim)).astype(np.float32)
+    vectors = centers[rng.integers(0, len(centers), size)] + 0.6 * rng.standard_normal((size, dim)).astype(np.float32)
+    return vectors
+
+
+def load_vectors(args):
+    if args.vectors:
+        return np.load(args.vectors).astype(np.float32), args.vectors
+    if args.product_index:
+        index = faiss.read_index(os.path.join(args.product_index, "index.faiss"))
+        return index.reconstruct_n(0, index.ntotal), f"{args.product_index} ({index.ntotal} products)"
+    return synthetic_vectors(args.size, args.dim, args.seed), f"synthetic ({args.size} x {args.dim})"
+
+
+def recall(found, corpus, queries, truth_scores):
+    """Mean fraction of the true top k that the backend returned.
+
+    A hit is any returned vector scoring at least the k-th exact score, so duplicate vectors
+    (ties) count whichever copy comes back.
+    """
+    hits = []
+    for rows, query, expected in zip(found, queries, truth_scores):
+        scores = corpus[rows[rows != -1]] @ query
+        hits.append(min(len(expected), int(np.sum(scores >= expected[-1] - 1e-5))) / len(expected))
+    return float(np.mean(hits))
+
+
+def measure(index, corpus, queries, truth_scores, k):
+    latencies, found = [], []
+    for query in queries:
+        start = time.perf_counter()
+        _, rows = index.search(query[None, :], k)
+        latencies.append(time.perf_counter() - start)
+        found.append(rows[0])
+    p50, p99 = np.percentile(latencies, [50, 99]) * 1e6
+    return {"recall": recall(found, corpus, queries, truth_scores), "p50_us": p50, "p99_us": p99}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", default=",".join(BACKENDS))
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--size", type=int, default=12000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--vectors")
+    parser.add_argument("--product-index")
+    parser.add_argument("--nprobe", default="1,4,8,16")
+    parser.add_argument("--ef-search", default="16,32,64,128")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--json")
+    args = parser.parse_args()
+
+    vectors, source = load_vectors(args)
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    faiss.normalize_L2(vectors)
+    order = np.random.default_rng(args.seed).permutation(len(vectors))
+    queries, corpus = vectors[order[:args.queries]], vectors[order[args.queries:]]
+
+    exact = faiss.IndexFlatIP(corpus.shape[1])
+    exact.add(corpus)
+    truth_scores, _ = exact.search(queries, args.k)
+
+    print(f"corpus: {source}, {len(corpus)} indexed, {len(queries)} held-out queries, recall@{args.k}\n")
+    print(f"{'backend':<8} {'index':<24} {'setting':<13} {'recall':>7} {'p50 us':>8} {'p99 us':>8} "
+          f"{'bytes/vec':>9} {'build s':>8}")
+    results = []
+    for backend in args.backends.split(","):
+        start = time.perf_counter()
+        index = build_index(corpus, backend)
+        build_seconds = time.perf_counter() - start
+        size = len(faiss.serialize_index(index)) / len(corpus)
+        spec = index_spec(backend, corpus.shape[1], len(corpus))
+        if faiss.try_extract_index_ivf(index) is not None:
+            settings = [("nprobe", int(value)) for value in args.nprobe.split(",")]
+        elif hasattr(index, "hnsw"):
+            settings = [("efSearch", int(value)) for value in args.ef_search.split(",")]
+        else:
+            settings = [(None, None)]
+        for name, value in settings:
+            if name == "nprobe":
+                configure_search(index, nprobe=value)
+            elif name == "efSearch":
+                configure_search(index, ef_search=value)
+            row = {"backend": backend, "index": spec, "setting": f"{name}={value}" if name else "",
+                   "bytes_per_vector": size, "build_seconds": build_seconds, **measure(index, corpus, queries, truth_scores, args.k)}
+            results.append(row)
+            print(f"{backend:<8} {spec:<24} {row['setting']:<13} {row['recall']:>7.3f} {row['p50_us']:>8.0f} "
+                  f"{row['p99_us']:>8.0f} {size:>9.0f} {build_seconds:>8.2f}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"source": source, "k": args.k, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
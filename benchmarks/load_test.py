@@ -0,0 +1,302 @@
+"""Load test for /api/chat with local stand-ins for MySQL, the LLMs and the embedding model.
+
+    python benchmarks/load_test.py --concurrency 1,8,32 --requests 300
+    python benchmarks/load_test.py --write-baseline        # store this machine's numbers
+    python benchmarks/load_test.py --check                 # exit 1 on a regression
+    python benchmarks/load_test.py --url http://localhost:5000  # drive a running server
+    python benchmarks/load_test.py --cold --vary           # cache misses and a varied request mix
+
+By default the Flask app is driven in-process through its test client, with MYSQL_FAKE,
+LLM_BACKEND=fake and EMBEDDINGS_BACKEND=fake, so runs need no network and are repeatable.
+Requests are drawn (with a fixed seed) from the weighted payloads in traffic_mix.jsonl.
+For each concurrency level the run reports throughput, p50/p95/p99 latency, errors and
+peak RSS; --check compares them with baselines.json within --tolerance.
+
+The warm-up leaves the FAQ answer cache and the pitch store full, so by default the levels
+measure a steady-state server serving repeated requests. --cold turns the answer cache off and
+gives every level an empty pitch store, so each FAQ question reaches the LLM and each product
+is pitched once per level. --vary draws FAQ questions from retrieval_questions.jsonl and
+random cursors and page sizes for product searches instead of the fixed payloads.
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import threading
+import urllib.error
+import urllib.request
+from contextlib import nullcontext
+import numpy as np
+import psutil
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, ROOT)
+
+# Page sizes drawn by --vary
+PAGE_SIZES = (5, 10, 20, 50)
+
+
+def load_mix(path):
+    entries = []
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                entries.append(json.loads(line))
+    return entries
+
+
+def plan_requests(mix, count, seed, questions=None, max_cursor=0):
+    """Draw `count` entries from the mix; with `questions`, vary the payload of each one."""
+    rng = random.Random(seed)
+    planned = rng.choices(mix, weights=[entry.get("weight", 1) for entry in mix], k=count)
+    if questions is None:
+        return planned
+    varied = []
+    for entry in planned:
+        payload = dict(entry["payload"])
+        if payload.get("choice") == "1":
+            payload["input"] = rng.choice(questions)
+        elif payload.get("input", "").startswith("find_products"):
+            payload["cursor"] = rng.randint(0, max_cursor)
+            payload["page_size"] = rng.choice(PAGE_SIZES)
+        varied.append({**entry, "payload": payload})
+    return varied
+
+
+def configure_local(args):
+    """Point the app at the local stand-ins; explicit environment settings win. Returns the scratch directory."""
+    scratch = tempfile.mkdtemp(prefix="chatbot-bench-")
+    defaults = {
+        "MYSQL_FAKE": "1",
+        "FAKE_MYSQL_PRODUCTS": str(args.products),
+        "LLM_BACKEND": "fake",
+        "EMBEDDINGS_BACKEND": "fake",
+        "FAKE_LLM_LATENCY": str(args.llm_latency),
+        "FAKE_LLM_TOKENS_PER_SECOND": str(args.tokens_per_second),
+        "FAQ_INDEX_DIR": os.path.join(scratch, "faq_index"),
+        "PRODUCT_INDEX_DIR": os.path.join(scratch, "product_index"),
+        "PITCH_STORE_PATH": os.path.join(scratch, "pitch_store.sqlite3"),
+    }
+    if args.cold:
+        defaults["FAQ_CACHE_SIZE"] = "0"
+    for name, value in defaults.items():
+        os.environ.setdefault(name, value)
+    # FAQ.py reads scalixity_faq_data.txt relative to the working directory
+    os.chdir(ROOT)
+    return scratch
+
+
+def reset_pitch_store(scratch, name):
+    """Give the in-process app an empty pitch store, so every product is pitched again."""
+    import app as flask_app
+    from pitch_store import PitchStore
+    flask_app.pitch_engine.store = PitchStore(path=os.path.join(scratch, f"pitch_store-{name}.sqlite3"))
+
+
+def in_process_client():
+    import app as flask_app
+    local = threading.local()
+
+    def send(payload):
+        client = getattr(local, "client", None)
+        if client is None:
+            client = local.client = flask_app.app.test_client()
+        response = client.post("/api/chat", json=payload)
+        return response.status_code, response.get_json(silent=True)
+
+    return send
+
+
+def http_client(base_url):
+    url = base_url.rstrip("/") + "/api/chat"
+
+    def send(payload):
+        request = urllib.request.Request(url, data=json.dumps(payload).encode("utf-8"),
+                                         headers={"Content-Type": "application/json"})
+        try:
+            with urllib.request.urlopen(request, timeout=120) as response:
+                return response.status, json.loads(response.read() or b"null")
+        except urllib.error.HTTPError as e:
+            return e.code, None
+
+    return send
+
+
+def is_error(status, body):
+    if status >= 400:
+        return True
+    content = (body or {}).get("content") if isinstance(body, dict) else None
+    return isinstance(content, str) and content.startswith("Error")
+
+
+class RSSSampler:
+    """Track this process's peak RSS while a level runs."""
+
+    def __init__(self, interval=0.05):
+        self.interval = interval
+        self.process = psutil.Process()
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        self.peak = self.process.memory_info().rss
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, self.process.memory_info().rss)
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, self.process.memory_info().rss)
+
+
+def run_level(send, planned, concurrency, measure_rss):
+    latencies, errors = [], {}
+    position = [0]
+    lock = threading.Lock()
+
+    def worker():
+        while True:
+            with lock:
+                if position[0] >= len(planned):
+                    return
+                entry = planned[position[0]]
+                position[0] += 1
+            start = time.perf_counter()
+            try:
+                status, body = send(entry["payload"])
+                failed = is_error(status, body)
+            except Exception as e:
+                print(f"Error sending {entry.get('name')}: {str(e)}")
+                failed = True
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+                if failed:
+                    errors[entry.get("name")] = errors.get(entry.get("name"), 0) + 1
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    with (RSSSampler() if measure_rss else nullcontext()) as sampler:
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        wall = time.perf_counter() - start
+
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) * 1000
+    return {
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "errors": sum(errors.values()),
+        "errors_by_payload": errors,
+        "rps": len(latencies) / wall,
+        "p50_ms": float(p50),
+        "p95_ms": float(p95),
+        "p99_ms": float(p99),
+        "peak_rss_mb": sampler.peak / 1e6 if sampler else None,
+    }
+
+
+def check(results, baselines, tolerance):
+    """Return the regressions of `results` against `baselines` ({concurrency: metrics})."""
+    problems = []
+    for result in results:
+        baseline = baselines.get(str(result["concurrency"]))
+        if not baseline:
+            continue
+        level = f"c={result['concurrency']}"
+        if result["rps"] < baseline["rps"] * (1 - tolerance):
+            problems.append(f"{level}: throughput {result['rps']:.1f} rps < baseline {baseline['rps']:.1f}")
+        if result["p99_ms"] > baseline["p99_ms"] * (1 + tolerance):
+            problems.append(f"{level}: p99 {result['p99_ms']:.0f} ms > baseline {baseline['p99_ms']:.0f}")
+        if result["peak_rss_mb"] and baseline.get("peak_rss_mb") \
+                and result["peak_rss_mb"] > baseline["peak_rss_mb"] * (1 + tolerance):
+            problems.append(f"{level}: peak RSS {result['peak_rss_mb']:.0f} MB > baseline {baseline['peak_rss_mb']:.0f}")
+        if result["errors"] > baseline.get("errors", 0):
+            problems.append(f"{level}: {result['errors']} errors > baseline {baseline.get('errors', 0)}")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mix", default=os.path.join(HERE, "traffic_mix.jsonl"))
+    parser.add_argument("--concurrency", default="1,8,32", help="comma-separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=200, help="requests per concurrency level")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--url", help="benchmark a running server instead of the in-process app")
+    parser.add_argument("--products", type=int, default=2000, help="size of the synthetic catalog")
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="fake LLM time to first token (s)")
+    parser.add_argument("--tokens-per-second", type=float, default=50)
+    parser.add_argument("--cold", action="store_true", help="no FAQ answer cache and an empty pitch store per level")
+    parser.add_argument("--vary", action="store_true", help="vary FAQ questions, cursors and page sizes")
+    parser.add_argument("--questions", default=os.path.join(HERE, "retrieval_questions.jsonl"),
+                        help="FAQ questions drawn by --vary")
+    parser.add_argument("--baseline", default=os.path.join(HERE, "baselines.json"))
+    parser.add_argument("--check", action="store_true", help="fail if a level regressed against the baseline")
+    parser.add_argument("--write-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    parser.add_argument("--output", help="also write the results as JSON here")
+    args = parser.parse_args()
+
+    if args.cold and args.url:
+        parser.error("--cold resets the in-process app's caches; start the server with FAQ_CACHE_SIZE=0 "
+                     "and a new PITCH_STORE_PATH instead")
+    mix = load_mix(args.mix)
+    questions = [entry["question"] for entry in load_mix(args.questions)] if args.vary else None
+    scratch = None
+    if args.url:
+        send = http_client(args.url)
+    else:
+        scratch = configure_local(args)
+        send = in_process_client()
+
+    # Warm up: builds the indexes, opens the pool and fills the caches a steady-state server would have
+    for entry in mix:
+        send(entry["payload"])
+
+    results = []
+    print(f"{'conc':>5} {'reqs':>6} {'errors':>6} {'rps':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'rss MB':>8}")
+    for concurrency in (int(level) for level in args.concurrency.split(",")):
+        planned = plan_requests(mix, args.requests, args.seed + concurrency, questions, max_cursor=args.products)
+        if args.cold:
+            reset_pitch_store(scratch, concurrency)
+        result = run_level(send, planned, concurrency, measure_rss=not args.url)
+        results.append(result)
+        rss = f"{result['peak_rss_mb']:.0f}" if result["peak_rss_mb"] else "-"
+        print(f"{concurrency:>5} {result['requests']:>6} {result['errors']:>6} {result['rps']:>8.1f} "
+              f"{result['p50_ms']:>8.1f} {result['p95_ms']:>8.1f} {result['p99_ms']:>8.1f} {rss:>8}")
+        if result["errors_by_payload"]:
+            print(f"      errors: {result['errors_by_payload']}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.write_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump({str(result["concurrency"]): {key: result[key] for key in
+                                                   ("rps", "p99_ms", "peak_rss_mb", "errors")}
+                       for result in results}, f, indent=2)
+        print(f"Baseline written to {args.baseline}")
+    if args.check:
+        if not os.path.exists(args.baseline):
+            sys.exit(f"No baseline at {args.baseline}; run with --write-baseline first")
+        with open(args.baseline) as f:
+            problems = check(results, json.load(f), args.tolerance)
+        if problems:
+            print("\nRegressions:\n  " + "\n  ".join(problems))
+            sys.exit(1)
+        print("\nNo regressions against the baseline.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""Startup benchmark: import-time cost per entry module and time until warm.
+
+    python benchmarks/startup.py [--fake] [--runs 3] [--top 10]
+
+Each measurement runs in a fresh interpreter. For every module it reports the wall time
+of `import <module>` and the slowest imports underneath it (from python -X importtime);
+it then times warming every subsystem through app.warm_subsystems. --fake uses the
+local stand-ins (MYSQL_FAKE, LLM_BACKEND=fake, EMBEDDINGS_BACKEND=fake).
+"""
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODULES = ("FAQ", "Shopping_assistant", "app")
+
+IMPORT_SNIPPET = "import time; start = time.perf_counter(); import {module}; print(time.perf_counter() - start)"
+WARM_SNIPPET = """
+import json, time
+start = time.perf_counter()
+import app
+imported = time.perf_counter() - start
+warmed = app.warm_subsystems(list(app.SUBSYSTEMS))
+print(json.dumps({"import": imported, "warm": warmed, "total": time.perf_counter() - start}))
+"""
+
+
+def run(code, env, importtime=False):
+    command = [sys.executable] + (["-X", "importtime"] if importtime else []) + ["-c", code]
+    result = subprocess.run(command, cwd=ROOT, env=env, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "failed")
+    lines = result.stdout.strip().splitlines()
+    return lines[-1] if lines else "", result.stderr
+
+
+def slowest_imports(importtime_log, top):
+    """The module's direct imports by cumulative time (microseconds) from -X importtime output."""
+    packages = {}
+    for line in importtime_log.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        # Nesting is shown by indentation; the module itself has 1 space, its direct imports 3
+        if len(name) - len(name.lstrip()) != 3:
+            continue
+        package = name.strip().split(".")[0]
+        packages[package] = packages.get(package, 0) + int(cumulative)
+    return sorted(packages.items(), key=lambda item: item[1], reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fake", action="store_true", help="use the local stand-ins for MySQL, LLMs and embeddings")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--top", type=int, default=8)
+    parser.add_argument("--no-warm", action="store_true", help="only measure imports")
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    if args.fake:
+        scratch = tempfile.mkdtemp(prefix="chatbot-startup-")
+        env.update({
+            "MYSQL_FAKE": "1", "LLM_BACKEND": "fake", "EMBEDDINGS_BACKEND": "fake", "FAKE_LLM_LATENCY": "0",
+            "FAQ_INDEX_DIR": os.path.join(scratch, "faq_index"),
+            "PITCH_STORE_PATH": os.path.join(scratch, "pitch_store.sqlite3"),
+        })
+
+    for module in MODULES:
+        try:
+            times = [float(run(IMPORT_SNIPPET.format(module=module), env)[0]) for _ in range(args.runs)]
+            _, log = run(f"import {module}", env, importtime=True)
+        except RuntimeError as e:
+            print(f"import {module}: error: {str(e)}")
+            continue
+        print(f"import {module}: median {statistics.median(times) * 1000:.0f} ms "
+              f"(min {min(times) * 1000:.0f}, max {max(times) * 1000:.0f}, {args.runs} runs)")
+        for package, microseconds in slowest_imports(log, args.top):
+            print(f"    {package:<28} {microseconds / 1000:8.1f} ms")
+
+    if not args.no_warm:
+        try:
+            result = json.loads(run(WARM_SNIPPET, env)[0])
+        except RuntimeError as e:
+            print(f"\nwarm-up: error: {str(e)}")
+            return
+        print(f"\nimport app {result['import'] * 1000:.0f} ms, ready after {result['total'] * 1000:.0f} ms")
+        for name, outcome in result["warm"].items():
+            error = f"  error: {outcome['error']}" if "error" in outcome else ""
+            print(f"    warm {name:<10} {outcome['seconds'] * 1000:8.0f} ms{error}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+import os
+import re
+import json
+import difflib
+import time
+import hashlib
+import threading
+
+
+# Spellings that name the same option; any member resolves to whatever the catalog calls it
+SYNONYM_GROUPS = [
+    {"grey", "gray"},
+    {"s", "small"},
+    {"m", "medium"},
+    {"l", "large"},
+    {"xl", "extra large", "x large", "xlarge"},
+    {"xxl", "2xl", "xx large", "extra extra large", "double extra large"},
+    {"t shirts", "t shirt", "tshirts", "tshirt", "tees", "tee"},
+    {"trousers", "pants"},
+    {"shoes", "sneakers", "footwear"},
+    {"hoodies", "hoodie", "sweatshirts"},
+]
+SYNONYMS = {alias: group for group in SYNONYM_GROUPS for alias in group}
+
+# Separators accepted between several values, e.g. "red or blue", "M, L"; captured so a
+# split keeps them and a run of values can be rejoined as written
+MULTI_VALUE_SEPARATOR = re.compile(r"(\s*(?:,|/|\bor\b|\band\b)\s*)")
+
+
+class CatalogCache:
+    """In-process cache for slow-changing catalog lookups such as categories, sizes and colors.
+
+    `loaders` maps a lookup name to a function returning {id: name}. Each lookup is loaded
+    once, served from memory, and refreshed in a background thread once it is older than
+    `ttl` seconds; readers keep getting the previous value until the refresh lands.
+    """
+
+    def __init__(self, loaders, ttl=None):
+        self.loaders = loaders
+        self.ttl = ttl if ttl is not None else float(os.getenv("CATALOG_CACHE_TTL", "600"))
+        self._entries = {}  # kind -> (data, etag, name index, loaded_at)
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self._load_locks = {kind: threading.Lock() for kind in loaders}
+
+    @staticmethod
+    def normalize_name(name):
+        """Lowercase, treat - and _ as spaces, drop other punctuation and collapse whitespace."""
+        name = re.sub(r"[-_]", " ", str(name).lower())
+        name = re.sub(r"[^a-z0-9 ]", "", name)
+        return " ".join(name.split())
+
+    @classmethod
+    def _name_keys(cls, name):
+        """Every key a catalog name should be reachable under: itself, its synonyms and its singular."""
+        key = cls.normalize_name(name)
+        keys = {key} | SYNONYMS.get(key, set())
+        keys |= {candidate[:-1] for candidate in keys if len(candidate) > 3 and candidate.endswith("s")}
+        return keys
+
+    @classmethod
+    def build_name_index(cls, data):
+        """Precompute the normalized name -> id lookup table for one catalog lookup."""
+        name_index = {}
+        # Exact names first so a synonym can never shadow a real option with that name
+        for item_id, name in data.items():
+            name_index[cls.normalize_name(name)] = item_id
+        for item_id, name in data.items():
+            for key in cls._name_keys(name):
+                name_index.setdefault(key, item_id)
+        return name_index
+
+    def _load(self, kind):
+        with self._load_locks[kind]:
+            data = self.loaders[kind]()
+            previous = self._entries.get(kind)
+            # The loaders swallow DB errors and return {}; keep serving the last good copy
+            if not data and previous is not None:
+                data = previous[0]
+            etag = hashlib.sha1(json.dumps(data, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+            name_index = self.build_name_index(data)
+            entry = (data, etag, name_index, time.time() if data else 0)
+            self._entries[kind] = entry
+            return entry
+
+    def _entry(self, kind):
+        entry = self._entries.get(kind)
+        if entry is None:
+            return self._load(kind)
+        if time.time() - entry[3] > self.ttl:
+            self._refresh_in_background(kind)
+        return entry
+
+    def _refresh_in_background(self, kind):
+        with self._lock:
+            if kind in self._refreshing:
+                return
+            self._refreshing.add(kind)
+
+        def refresh():
+            try:
+                self._load(kind)
+            except Exception as e:
+                print(f"Error refreshing catalog {kind}: {str(e)}")
+            finally:
+                with self._lock:
+                    self._refreshing.discard(kind)
+
+        threading.Thread(target=refresh, name=f"catalog-refresh-{kind}", daemon=True).start()
+
+    def loaded(self):
+        """True once every lookup has been loaded at least once."""
+        return all(kind in self._entries for kind in self.loaders)
+
+    def get(self, kind):
+        """Return (data, etag) for a lookup."""
+        data, etag, _, _ = self._entry(kind)
+        return data, etag
+
+    def resolve(self, kind, name, fuzzy=True):
+        """Return the id for `name`, tolerating case, synonyms, plurals and (with `fuzzy`) small typos; None if unknown."""
+        name_index = self._entry(kind)[2]
+        key = self.normalize_name(name)
+        for candidate in (key, key[:-1] if key.endswith("s") else None):
+            if candidate and candidate in name_index:
+                return name_index[candidate]
+            if candidate in SYNONYMS:
+                for alias in SYNONYMS[candidate]:
+                    if alias in name_index:
+                        return name_index[alias]
+        # Short keys like "s" or "m" are too ambiguous to fuzzy-match
+        if fuzzy and len(key) > 3:
+            match = difflib.get_close_matches(key, name_index, n=1, cutoff=0.8)
+            if match:
+                return name_index[match[0]]
+        return None
+
+    def _resolve_value(self, kind, value, fuzzy=True):
+        # A number is an id only if this lookup has it; otherwise it may still be a name, e.g. size "32"
+        if value.isdigit() and int(value) in self._entry(kind)[0]:
+            return int(value)
+        return self.resolve(kind, value, fuzzy)
+
+    def resolve_many(self, kind, text):
+        """Resolve "red or blue", "M, L" or "12,13" into (ids, unknown values).
+
+        The longest run of values that is itself a name wins, so "Bags and Accessories" is one
+        category rather than two; numeric values must be ids of this lookup.
+        """
+        # Values at even positions, the separators between them at odd ones
+        parts = MULTI_VALUE_SEPARATOR.split(str(text).strip())
+        values = parts[::2]
+        ids, unknown = [], []
+        start = 0
+        while start < len(values):
+            end, item_id = start + 1, None
+            # Joined runs only match exactly, so "red or blue" cannot fuzzy-match a single name
+            for stop in range(len(values), start + 1, -1):
+                item_id = self._resolve_value(kind, "".join(parts[2 * start:2 * stop - 1]), fuzzy=False)
+                if item_id is not None:
+                    end = stop
+                    break
+            value = values[start]
+            if item_id is None and value:
+                item_id = self._resolve_value(kind, value)
+                if item_id is None:
+                    unknown.append(value)
+            if item_id is not None and item_id not in ids:
+                ids.append(item_id)
+            start = end
+        return ids, unknown
+
+    def invalidate(self, kind=None):
+        """Reload one lookup (or all of them) right away and return their new ETags."""
+        kinds = [kind] if kind else list(self.loaders)
+        return {name: self._load(name)[1] for name in kinds}
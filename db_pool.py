@@ -0,0 +1,243 @@
+import os
+import time
+import threading
+from metrics import observe
+
+
+class TimedCursor:
+    """Cursor wrapper recording each query, from execute() through its fetches, as one db_query observation."""
+
+    def __init__(self, raw):
+        self._raw = raw
+        self._elapsed = None
+
+    def _timed(self, method, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return getattr(self._raw, method)(*args, **kwargs)
+        finally:
+            self._elapsed = (self._elapsed or 0.0) + time.perf_counter() - start
+
+    def _flush(self):
+        if self._elapsed is not None:
+            observe("db_query", self._elapsed)
+            self._elapsed = None
+
+    def execute(self, *args, **kwargs):
+        self._flush()
+        return self._timed("execute", *args, **kwargs)
+
+    def executemany(self, *args, **kwargs):
+        self._flush()
+        return self._timed("executemany", *args, **kwargs)
+
+    def fetchone(self):
+        return self._timed("fetchone")
+
+    def fetchmany(self, *args, **kwargs):
+        return self._timed("fetchmany", *args, **kwargs)
+
+    def fetchall(self):
+        return self._timed("fetchall")
+
+    def close(self):
+        self._flush()
+        return self._raw.close()
+
+    def __iter__(self):
+        return iter(self.fetchall())
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+
+class PooledConnection:
+    """Connection handed out by the pool; close() returns it to the pool instead of closing it."""
+
+    def __init__(self, pool, raw, created_at):
+        self._pool = pool
+        self._raw = raw
+        self.created_at = created_at
+        self._released = False
+
+    def cursor(self, *args, **kwargs):
+        return TimedCursor(self._raw.cursor(*args, **kwargs))
+
+    def close(self):
+        if not self._released:
+            self._released = True
+            self._pool._release(self._raw, self.created_at)
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class ConnectionPool:
+    """Fixed-size connection pool with health checks on checkout and recycling of old connections."""
+
+    def __init__(self, factory, size=5, recycle=1800, timeout=10):
+        self.factory = factory
+        self.size = size
+        self.recycle = recycle
+        self.timeout = timeout
+        self._idle = []  # (raw connection, created_at), most recently returned last
+        self._open = 0
+        self._cond = threading.Condition()
+        self._stats = {
+            "checkouts": 0,
+            "waits": 0,
+            "wait_seconds_total": 0.0,
+            "wait_seconds_max": 0.0,
+            "created": 0,
+            "recycled": 0,
+            "health_check_failures": 0,
+        }
+
+    def get_connection(self):
+        """Check out a healthy connection, waiting up to `timeout` seconds if the pool is exhausted."""
+        start_time = time.time()
+        deadline = start_time + self.timeout
+        waited = False
+        with self._cond:
+            while True:
+                if self._idle:
+                    raw, created_at = self._idle.pop()
+                    break
+                if self._open < self.size:
+                    self._open += 1
+                    raw, created_at = None, None
+                    break
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    raise Exception(f"Timed out after {self.timeout}s waiting for a database connection")
+                waited = True
+                self._cond.wait(remaining)
+
+        if raw is not None and time.time() - created_at > self.recycle:
+            self._discard(raw, "recycled")
+            raw = None
+        elif raw is not None and not self._is_healthy(raw):
+            self._discard(raw, "health_check_failures")
+            raw = None
+
+        if raw is None:
+            try:
+                raw = self.factory()
+            except Exception:
+                with self._cond:
+                    self._open -= 1
+                    self._cond.notify()
+                raise
+            created_at = time.time()
+            with self._cond:
+                self._stats["created"] += 1
+
+        wait_time = time.time() - start_time
+        with self._cond:
+            self._stats["checkouts"] += 1
+            if waited:
+                self._stats["waits"] += 1
+            self._stats["wait_seconds_total"] += wait_time
+            self._stats["wait_seconds_max"] = max(self._stats["wait_seconds_max"], wait_time)
+        return PooledConnection(self, raw, created_at)
+
+    @staticmethod
+    def _is_healthy(raw):
+        try:
+            return raw.is_connected()
+        except Exception:
+            return False
+
+    def _discard(self, raw, reason):
+        try:
+            raw.close()
+        except Exception:
+            pass
+        with self._cond:
+            self._stats[reason] += 1
+
+    def _release(self, raw, created_at):
+        with self._cond:
+            self._idle.append((raw, created_at))
+            self._cond.notify()
+
+    def close_all(self):
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._open -= len(idle)
+        for raw, _ in idle:
+            try:
+                raw.close()
+            except Exception:
+                pass
+
+    def stats(self):
+        with self._cond:
+            stats = dict(self._stats)
+            stats.update({
+                "size": self.size,
+                "open": self._open,
+                "idle": len(self._idle),
+                "in_use": self._open - len(self._idle),
+            })
+        checkouts = stats["checkouts"]
+        stats["wait_seconds_avg"] = stats["wait_seconds_total"] / checkouts if checkouts else 0.0
+        return stats
+
+
+def _mysql_connect():
+    import mysql.connector
+    return mysql.connector.connect(
+        host=os.getenv("MYSQL_HOST"),
+        user=os.getenv("MYSQL_USER"),
+        password=os.getenv("MYSQL_PASSWORD"),
+        database=os.getenv("MYSQL_DATABASE"),
+        # Every query is a read; autocommit keeps pooled connections from pinning an old snapshot
+        autocommit=True
+    )
+
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Return the process-wide pool, created from the MYSQL_* environment on first use.
+
+    Set MYSQL_FAKE=1 to back the pool with the SQLite stand-in from fake_mysql instead
+    of a real MySQL server.
+    """
+    global _pool, _pool_pid
+    # A forked worker must not share the parent's sockets; it builds its own pool
+    if _pool is None or _pool_pid != os.getpid():
+        with _pool_lock:
+            if _pool is None or _pool_pid != os.getpid():
+                if os.getenv("MYSQL_FAKE") == "1":
+                    import fake_mysql
+                    factory = fake_mysql.connect
+                else:
+                    factory = _mysql_connect
+                _pool = ConnectionPool(
+                    factory,
+                    size=int(os.getenv("MYSQL_POOL_SIZE", "5")),
+                    recycle=float(os.getenv("MYSQL_POOL_RECYCLE", "1800")),
+                    timeout=float(os.getenv("MYSQL_POOL_TIMEOUT", "10")),
+                )
+                _pool_pid = os.getpid()
+    return _pool
+
+
+def get_db_connection():
+    """Check out a pooled connection; call close() on it to hand it back."""
+    try:
+        return get_pool().get_connection()
+    except Exception as e:
+        print(f"Error connecting to the database: {e}")
+        raise Exception(f"Database connection failed: {str(e)}")
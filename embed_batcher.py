@@ -0,0 +1,114 @@
+import os
+import time
+import queue
+import asyncio
+import threading
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from metrics import observe
+
+
+class EmbedBatcher:
+    """Micro-batch concurrent query embeddings into one forward pass.
+
+    Callers block in embed_query() while a dispatcher thread collects requests: under
+    concurrent load the first one opens a window of `window_ms` milliseconds
+    (EMBED_BATCH_WINDOW_MS) that closes early once `max_batch` (EMBED_BATCH_SIZE) texts
+    are waiting; a request arriving alone is embedded right away. The whole batch goes to
+    `embeddings.embed_documents` in one call and each caller gets its own vector back.
+    Identical texts in a batch are embedded once.
+    """
+
+    def __init__(self, embeddings, window_ms=None, max_batch=None, timeout=None):
+        self.embeddings = embeddings
+        self.window = (window_ms if window_ms is not None else float(os.getenv("EMBED_BATCH_WINDOW_MS", "3"))) / 1000
+        self.max_batch = max_batch or int(os.getenv("EMBED_BATCH_SIZE", "32"))
+        self.timeout = timeout or float(os.getenv("EMBED_BATCH_TIMEOUT", "30"))
+        self._queue = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.batches = 0
+        self.items = 0
+        self.largest_batch = 0
+
+    def _ensure_started(self):
+        # Started on first use, so a pre-fork master never owns the thread
+        if self._thread is None or not self._thread.is_alive():
+            with self._start_lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self._run, name="embed-batcher", daemon=True)
+                    self._thread.start()
+
+    def _collect(self, concurrent):
+        batch = [self._queue.get()]
+        # A lone caller is not held back: the window only opens while requests overlap
+        # (the last batch had company or others are already queued)
+        if not concurrent and self._queue.empty():
+            return batch
+        deadline = time.perf_counter() + self.window
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        concurrent = False
+        while True:
+            batch = self._collect(concurrent)
+            concurrent = len(batch) > 1
+            # Callers that gave up (a cancelled async request) are dropped here, so resolving
+            # the rest of the batch never trips over a cancelled future
+            batch = [(text, future) for text, future in batch if future.set_running_or_notify_cancel()]
+            texts = list(dict.fromkeys(text for text, _ in batch))
+            if not texts:
+                continue
+            try:
+                start = time.perf_counter()
+                vectors = dict(zip(texts, self.embeddings.embed_documents(texts)))
+                observe("embed_batch", time.perf_counter() - start)
+                for text, future in batch:
+                    future.set_result(vectors[text])
+            except Exception as e:
+                print(f"Error embedding batch of {len(batch)}: {str(e)}")
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+            with self._stats_lock:
+                self.batches += 1
+                self.items += len(batch)
+                self.largest_batch = max(self.largest_batch, len(batch))
+
+    def submit(self, text):
+        """Queue one query; returns a concurrent.futures.Future for its vector."""
+        self._ensure_started()
+        future = Future()
+        self._queue.put((text, future))
+        return future
+
+    def embed_query(self, text):
+        """Block for the vector; raises concurrent.futures.TimeoutError after `timeout` (EMBED_BATCH_TIMEOUT) seconds."""
+        future = self.submit(text)
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeout:
+            future.cancel()
+            raise
+
+    async def aembed_query(self, text):
+        return await asyncio.wrap_future(self.submit(text))
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                "batches": self.batches,
+                "items": self.items,
+                "mean_batch_size": self.items / self.batches if self.batches else 0.0,
+                "largest_batch": self.largest_batch,
+                "window_ms": self.window * 1000,
+                "max_batch": self.max_batch,
+            }
@@ -0,0 +1,249 @@
+import os
+import time
+import threading
+from functools import reduce
+import numpy as np
+from db_pool import get_db_connection
+
+# attribute_id of the color and size rows in product_attribute_values and attribute_options
+COLOR_ATTRIBUTE_ID = 23
+SIZE_ATTRIBUTE_ID = 24
+FACETS = ("category", "size", "color")
+
+EXPORT_STATUS_QUERY = """
+    SELECT pf.product_id, MAX(pf.status) AS status, MAX(pf.updated_at) AS updated_at
+    FROM ecommerce.product_flat pf
+    {where}
+    GROUP BY pf.product_id
+"""
+DELTA_QUERY = """
+    SELECT pf.product_id, MAX(pf.updated_at) AS updated_at
+    FROM ecommerce.product_flat pf
+    WHERE pf.updated_at >= %s
+    GROUP BY pf.product_id
+"""
+ACTIVE_IDS_QUERY = """
+    SELECT pf.product_id
+    FROM ecommerce.product_flat pf
+    GROUP BY pf.product_id
+    HAVING MAX(pf.status) = 1
+"""
+EXPORT_CATEGORIES_QUERY = "SELECT pc.product_id, pc.category_id FROM ecommerce.product_categories pc {where}"
+EXPORT_ATTRIBUTES_QUERY = f"""
+    SELECT pav.product_id, pav.attribute_id, pav.integer_value
+    FROM ecommerce.product_attribute_values pav
+    WHERE pav.attribute_id IN ({COLOR_ATTRIBUTE_ID}, {SIZE_ATTRIBUTE_ID}) {{where}}
+"""
+
+
+def _execute(query, params=()):
+    conn = get_db_connection()
+    cur = None
+    try:
+        cur = conn.cursor(dictionary=True)
+        cur.execute(query, params)
+        return cur.fetchall()
+    finally:
+        if cur is not None:
+            cur.close()
+        conn.close()
+
+
+def _watermark(rows):
+    """The newest updated_at in rows and the ids of the products updated at exactly that time."""
+    stamps = [row["updated_at"] for row in rows if row["updated_at"] is not None]
+    if not stamps:
+        return None, frozenset()
+    last_updated = max(stamps)
+    return last_updated, frozenset(row["product_id"] for row in rows if row["updated_at"] == last_updated)
+
+
+class FacetIndex:
+    """In-memory category/size/color index over active products.
+
+    Every facet value maps to a sorted int64 NumPy array of product ids, so a search is a
+    union within a facet and an intersection across facets. The index is built from a bulk
+    export of product_categories and product_attribute_values, then kept current from
+    product_flat.updated_at deltas plus a diff of the active ids, which catches products
+    deleted outright; each update publishes a fresh state with one swap.
+    Only the arrays are kept: a refresh finds a changed product's old postings by scanning
+    them for its id.
+    """
+
+    def __init__(self):
+        # (postings {(facet, value): ids}, all active ids, last updated_at, ids updated at exactly that time)
+        self._state = None
+        self._lock = threading.Lock()
+        self._refresher = None
+        self.built_at = None
+
+    @property
+    def ready(self):
+        return self._state is not None
+
+    def _export(self, product_ids=None):
+        """Export facets for all products, or only for `product_ids`.
+
+        Returns {id: facet sets} of the active ones, the newest updated_at and the ids updated at that time.
+        """
+        if product_ids is None:
+            where, params = "", ()
+        else:
+            placeholders = ", ".join(["%s"] * len(product_ids))
+            where, params = f"product_id IN ({placeholders})", tuple(product_ids)
+
+        statuses = _execute(EXPORT_STATUS_QUERY.format(where=f"WHERE pf.{where}" if where else ""), params)
+        products = {}
+        for row in statuses:
+            if row["status"] == 1:
+                products[row["product_id"]] = {"category": set(), "size": set(), "color": set()}
+
+        for row in _execute(EXPORT_CATEGORIES_QUERY.format(where=f"WHERE pc.{where}" if where else ""), params):
+            if row["product_id"] in products:
+                products[row["product_id"]]["category"].add(row["category_id"])
+        for row in _execute(EXPORT_ATTRIBUTES_QUERY.format(where=f"AND pav.{where}" if where else ""), params):
+            facets = products.get(row["product_id"])
+            if facets is not None:
+                facet = "color" if row["attribute_id"] == COLOR_ATTRIBUTE_ID else "size"
+                facets[facet].add(row["integer_value"])
+        return (products, *_watermark(statuses))
+
+    @staticmethod
+    def _postings(products):
+        postings = {}
+        for product_id, facets in products.items():
+            for facet, values in facets.items():
+                for value in values:
+                    postings.setdefault((facet, value), []).append(product_id)
+        return {key: np.array(sorted(ids), dtype=np.int64) for key, ids in postings.items()}
+
+    def build(self):
+        """Rebuild the whole index from a bulk export."""
+        start_time = time.time()
+        products, last_updated, at_last_updated = self._export()
+        state = (self._postings(products), np.array(sorted(products), dtype=np.int64), last_updated, at_last_updated)
+        with self._lock:
+            self._state = state
+        self.built_at = time.time()
+        print(f"Built facet index ({len(products)} products) in {time.time() - start_time:.2f} seconds")
+
+    def refresh(self):
+        """Apply products changed or deleted since the last build/refresh; returns how many were re-read.
+
+        Changes are read with updated_at >= the last one seen, since a write in the same
+        second has an equal timestamp; products already applied at exactly that time are skipped.
+        Indexed products no longer active in product_flat, e.g. deleted rows, are dropped.
+        """
+        if self._state is None:
+            self.build()
+            return len(self._state[1])
+        postings, all_ids, last_updated, at_last_updated = self._state
+        rows = [] if last_updated is None else [
+            row for row in _execute(DELTA_QUERY, (last_updated,))
+            if not (row["updated_at"] == last_updated and row["product_id"] in at_last_updated)]
+        active = np.array(sorted(row["product_id"] for row in _execute(ACTIVE_IDS_QUERY)), dtype=np.int64)
+        gone = np.setdiff1d(all_ids, active, assume_unique=True)
+        if not rows and not gone.size:
+            return 0
+
+        changed = np.union1d(np.array([row["product_id"] for row in rows], dtype=np.int64), gone)
+        fresh, _, _ = self._export(changed.tolist())
+        updated = {}
+        for key, ids in postings.items():
+            stale = np.isin(ids, changed, assume_unique=True)
+            if stale.any():
+                updated[key] = ids[~stale]
+        for key, ids in self._postings(fresh).items():
+            updated[key] = np.union1d(updated.get(key, postings.get(key, ids)), ids)
+        postings = {key: ids for key, ids in {**postings, **updated}.items() if ids.size}
+        all_ids = np.union1d(np.setdiff1d(all_ids, changed, assume_unique=True), np.array(sorted(fresh), dtype=np.int64))
+
+        newest, at_newest = _watermark(rows)
+        if newest is None or newest == last_updated:
+            newest, at_newest = last_updated, at_last_updated | at_newest
+        state = (postings, all_ids, newest, at_newest)
+        with self._lock:
+            self._state = state
+        return len(changed)
+
+    def start_refresher(self, interval=None, rebuild_interval=None):
+        """Refresh from deltas in a daemon thread, with a full rebuild every `rebuild_interval` seconds.
+
+        The rebuild (FACET_REBUILD_INTERVAL, 0 disables it) also picks up category and
+        attribute rows changed without touching product_flat.updated_at.
+        """
+        if self._refresher is not None:
+            return self._refresher
+        if interval is None:
+            interval = float(os.getenv("FACET_REFRESH_INTERVAL", "60"))
+        if rebuild_interval is None:
+            rebuild_interval = float(os.getenv("FACET_REBUILD_INTERVAL", "3600"))
+
+        def run():
+            while True:
+                time.sleep(interval)
+                try:
+                    if rebuild_interval and time.time() - self.built_at >= rebuild_interval:
+                        self.build()
+                    else:
+                        self.refresh()
+                except Exception as e:
+                    print(f"Error refreshing facet index: {str(e)}")
+
+        self._refresher = threading.Thread(target=run, name="facet-index-refresher", daemon=True)
+        self._refresher.start()
+        return self._refresher
+
+    @staticmethod
+    def _match(state, filters):
+        """Intersect, across facets, the union of each facet's requested values; None/empty means any."""
+        postings, all_ids, _, _ = state
+        empty = np.array([], dtype=np.int64)
+        result = all_ids
+        for facet, values in filters.items():
+            if not values:
+                continue
+            arrays = [postings.get((facet, value), empty) for value in values]
+            union = reduce(np.union1d, arrays) if len(arrays) > 1 else arrays[0]
+            result = np.intersect1d(result, union, assume_unique=True)
+        return result
+
+    def query(self, category_ids=(), size_ids=(), color_ids=()):
+        """Return the sorted ids of active products matching every facet."""
+        return self._match(self._state, {"category": category_ids, "size": size_ids, "color": color_ids})
+
+    def facet_counts(self, category_ids=(), size_ids=(), color_ids=()):
+        """Count matches per facet value, applying the other facets' filters (e.g. red M shirts per size)."""
+        state = self._state
+        filters = {"category": category_ids, "size": size_ids, "color": color_ids}
+        postings = state[0]
+        counts = {}
+        for facet in FACETS:
+            base = self._match(state, {name: values for name, values in filters.items() if name != facet})
+            counts[facet] = {}
+            for (posting_facet, value), ids in postings.items():
+                if posting_facet == facet:
+                    count = int(np.intersect1d(base, ids, assume_unique=True).size)
+                    if count:
+                        counts[facet][value] = count
+        return counts
+
+
+facet_index = FacetIndex()
+_build_lock = threading.Lock()
+
+
+def get_facet_index():
+    """Return the shared facet index, building it on first use; None if disabled (FACET_INDEX=0) or unavailable."""
+    if os.getenv("FACET_INDEX", "1") != "1":
+        return None
+    if not facet_index.ready:
+        with _build_lock:
+            if not facet_index.ready:
+                try:
+                    facet_index.build()
+                    facet_index.start_refresher()
+                except Exception as e:
+                    print(f"Error building facet index, falling back to SQL: {str(e)}")
+                    return None
+    return facet_index
@@ -0,0 +1,87 @@
+"""Local stand-ins for the LLMs and the embedding model, for benchmarks and offline runs.
+
+Enable them with LLM_BACKEND=fake and EMBEDDINGS_BACKEND=fake. The fake LLM waits
+FAKE_LLM_LATENCY seconds before its first token and then emits FAKE_LLM_TOKENS tokens at
+FAKE_LLM_TOKENS_PER_SECOND, so serving code sees the same timing shape as a real model
+without network access. The fake embeddings hash words into a fixed-size vector, so
+questions sharing words get similar vectors.
+"""
+import os
+import re
+import json
+import time
+import asyncio
+import hashlib
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.llms import LLM
+from langchain_core.outputs import GenerationChunk
+
+BATCH_COUNT = re.compile(r"The following are (\d+) product descriptions")
+PITCH_WORDS = ("Comfortable", "durable", "and", "stylish", "-", "an", "easy", "everyday", "favourite",
+               "that", "looks", "great", "and", "feels", "even", "better")
+
+
+class FakeLLM(LLM):
+    """LangChain LLM with configurable time to first token and tokens per second."""
+
+    latency: float = float(os.getenv("FAKE_LLM_LATENCY", "0.2"))
+    tokens_per_second: float = float(os.getenv("FAKE_LLM_TOKENS_PER_SECOND", "50"))
+    tokens: int = int(os.getenv("FAKE_LLM_TOKENS", "30"))
+
+    @property
+    def _llm_type(self):
+        return "fake"
+
+    def _tokens(self, prompt):
+        batch = BATCH_COUNT.search(prompt)
+        if batch:
+            # Batched pitch prompts expect a JSON array with one pitch per product
+            count = int(batch.group(1))
+            sentence = " ".join(PITCH_WORDS) + "."
+            return [json.dumps([{"id": index, "pitch": sentence} for index in range(count)])]
+        words = [PITCH_WORDS[index % len(PITCH_WORDS)] for index in range(self.tokens)]
+        return [word + " " for word in words[:-1]] + [words[-1] + "."]
+
+    def _token_delay(self):
+        return 1.0 / self.tokens_per_second if self.tokens_per_second > 0 else 0.0
+
+    def _call(self, prompt, stop=None, run_manager=None, **kwargs):
+        tokens = self._tokens(prompt)
+        time.sleep(self.latency + self._token_delay() * len(tokens))
+        return "".join(tokens)
+
+    async def _acall(self, prompt, stop=None, run_manager=None, **kwargs):
+        tokens = self._tokens(prompt)
+        await asyncio.sleep(self.latency + self._token_delay() * len(tokens))
+        return "".join(tokens)
+
+    def _stream(self, prompt, stop=None, run_manager=None, **kwargs):
+        time.sleep(self.latency)
+        for token in self._tokens(prompt):
+            time.sleep(self._token_delay())
+            chunk = GenerationChunk(text=token)
+            if run_manager:
+                run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+
+
+class FakeEmbeddings(Embeddings):
+    """Deterministic bag-of-hashed-words embeddings with the dimension of all-MiniLM-L6-v2."""
+
+    def __init__(self, dimension=384):
+        self.dimension = dimension
+
+    def _embed(self, text):
+        vector = np.zeros(self.dimension, dtype=np.float32)
+        for word in re.findall(r"[a-z0-9]+", text.lower()):
+            digest = hashlib.md5(word.encode("utf-8")).digest()
+            vector[int.from_bytes(digest[:4], "little") % self.dimension] += 1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts):
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text):
+        return self._embed(text)
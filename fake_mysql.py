@@ -0,0 +1,181 @@
+"""SQLite stand-in for the ecommerce MySQL database, for local runs without a server.
+
+Enable it with MYSQL_FAKE=1. The tables live in a shared in-memory database attached
+as `ecommerce`, so both `ecommerce.product_flat` and unqualified names such as
+`category_translations` resolve the same way they do against MySQL.
+"""
+import os
+import re
+import random
+import sqlite3
+import threading
+from facet_index import COLOR_ATTRIBUTE_ID, SIZE_ATTRIBUTE_ID
+
+MAIN_URI = "file:scalixity_fake_main?mode=memory&cache=shared"
+ECOMMERCE_URI = "file:scalixity_fake_ecommerce?mode=memory&cache=shared"
+
+CATEGORIES = ["Root", "Shirts", "T-Shirts", "Shoes", "Hoodies", "Trousers"]
+SIZES = ["S", "M", "L", "XL", "XXL"]
+COLORS = ["Red", "Blue", "Black", "White", "Grey", "Green"]
+ADJECTIVES = ["Classic", "Slim Fit", "Breathable", "Everyday", "Premium", "Lightweight", "Relaxed"]
+
+SCHEMA = """
+CREATE TABLE ecommerce.category_translations (
+    category_id INTEGER, name TEXT, locale TEXT DEFAULT 'en'
+);
+CREATE TABLE ecommerce.attribute_options (
+    id INTEGER PRIMARY KEY, attribute_id INTEGER, admin_name TEXT
+);
+CREATE TABLE ecommerce.product_flat (
+    id INTEGER PRIMARY KEY, product_id INTEGER, name TEXT, short_description TEXT,
+    description TEXT, url_key TEXT, status INTEGER, updated_at TEXT
+);
+CREATE TABLE ecommerce.product_categories (
+    product_id INTEGER, category_id INTEGER
+);
+CREATE TABLE ecommerce.product_attribute_values (
+    id INTEGER PRIMARY KEY, product_id INTEGER, attribute_id INTEGER, integer_value INTEGER
+);
+"""
+
+_keeper = None
+_keeper_lock = threading.Lock()
+
+
+def _open():
+    raw = sqlite3.connect(MAIN_URI, uri=True, check_same_thread=False)
+    raw.execute("ATTACH DATABASE ? AS ecommerce", (ECOMMERCE_URI,))
+    return raw
+
+
+def seed(raw, n_products=None, rng_seed=42):
+    """Create the schema and fill it with a synthetic catalog of `n_products` products."""
+    if n_products is None:
+        n_products = int(os.getenv("FAKE_MYSQL_PRODUCTS", "200"))
+    rng = random.Random(rng_seed)
+    raw.executescript(SCHEMA)
+
+    raw.executemany(
+        "INSERT INTO ecommerce.category_translations (category_id, name) VALUES (?, ?)",
+        list(enumerate(CATEGORIES, start=1))
+    )
+    size_ids = list(range(1, len(SIZES) + 1))
+    color_ids = list(range(len(SIZES) + 1, len(SIZES) + len(COLORS) + 1))
+    raw.executemany(
+        "INSERT INTO ecommerce.attribute_options (id, attribute_id, admin_name) VALUES (?, ?, ?)",
+        [(option_id, SIZE_ATTRIBUTE_ID, name) for option_id, name in zip(size_ids, SIZES)]
+        + [(option_id, COLOR_ATTRIBUTE_ID, name) for option_id, name in zip(color_ids, COLORS)]
+    )
+
+    products, categories, attributes = [], [], []
+    for product_id in range(1, n_products + 1):
+        category_id = rng.randint(2, len(CATEGORIES))
+        category = CATEGORIES[category_id - 1]
+        name = f"{rng.choice(ADJECTIVES)} {category[:-1] if category.endswith('s') else category} {product_id}"
+        short_description = (f"<p>The <b>{name}</b> is made for comfort and style.</p>"
+                             f"<ul><li>Soft, durable fabric</li><li>Easy care</li></ul>")
+        description = short_description + "<p>" + " ".join(["Designed for daily wear."] * 20) + "</p>"
+        url_key = name.lower().replace(" ", "-")
+        status = 1 if rng.random() < 0.9 else 0
+        products.append((product_id, name, short_description, description, url_key, status,
+                         f"2024-01-{rng.randint(1, 28):02d} 00:00:00"))
+        categories.append((product_id, category_id))
+        for size_id in rng.sample(size_ids, rng.randint(1, len(size_ids))):
+            attributes.append((product_id, SIZE_ATTRIBUTE_ID, size_id))
+        for color_id in rng.sample(color_ids, rng.randint(1, 3)):
+            attributes.append((product_id, COLOR_ATTRIBUTE_ID, color_id))
+
+    raw.executemany(
+        "INSERT INTO ecommerce.product_flat "
+        "(product_id, name, short_description, description, url_key, status, updated_at) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+        products
+    )
+    raw.executemany("INSERT INTO ecommerce.product_categories VALUES (?, ?)", categories)
+    raw.executemany(
+        "INSERT INTO ecommerce.product_attribute_values (product_id, attribute_id, integer_value) "
+        "VALUES (?, ?, ?)",
+        attributes
+    )
+    raw.commit()
+
+
+def _ensure_seeded():
+    # The keeper connection holds the shared in-memory database open for the process lifetime
+    global _keeper
+    if _keeper is None:
+        with _keeper_lock:
+            if _keeper is None:
+                raw = _open()
+                seed(raw)
+                _keeper = raw
+
+
+class FakeCursor:
+    """DB-API cursor that accepts MySQL-style %s placeholders and dictionary rows."""
+
+    def __init__(self, raw_cursor, dictionary=False):
+        self._cursor = raw_cursor
+        self._dictionary = dictionary
+
+    @staticmethod
+    def _translate(query):
+        return re.sub(r"%s", "?", query)
+
+    def execute(self, query, params=()):
+        self._cursor.execute(self._translate(query), tuple(params or ()))
+
+    def executemany(self, query, seq_of_params):
+        self._cursor.executemany(self._translate(query), seq_of_params)
+
+    def _row(self, row):
+        if not self._dictionary or row is None:
+            return row
+        return {column[0]: value for column, value in zip(self._cursor.description, row)}
+
+    def fetchone(self):
+        return self._row(self._cursor.fetchone())
+
+    def fetchall(self):
+        return [self._row(row) for row in self._cursor.fetchall()]
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    def close(self):
+        self._cursor.close()
+
+
+class FakeConnection:
+    """Just enough of mysql.connector's connection API for the assistants and the pool."""
+
+    def __init__(self, raw):
+        self._raw = raw
+        self._closed = False
+
+    def cursor(self, dictionary=False, **kwargs):
+        return FakeCursor(self._raw.cursor(), dictionary=dictionary)
+
+    def is_connected(self):
+        return not self._closed
+
+    def commit(self):
+        self._raw.commit()
+
+    def rollback(self):
+        self._raw.rollback()
+
+    def close(self):
+        self._closed = True
+        self._raw.close()
+
+
+def connect(**kwargs):
+    """Drop-in replacement for mysql.connector.connect; connection arguments are ignored."""
+    _ensure_seeded()
+    return FakeConnection(_open())
@@ -0,0 +1,292 @@
+import os
+import json
+import time
+import pickle
+import hashlib
+import threading
+from langchain_community.vectorstores import FAISS
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.document_loaders import TextLoader
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+from vector_backends import CompactVectorStore, copy_index, read_index
+from metrics import span
+
+INDEX_FILE = "index.faiss"
+DOCSTORE_FILE = "index.pkl"
+META_FILE = "meta.json"
+
+
+def chunk_fingerprint(text):
+    """Return the stable id used for a chunk: the SHA-256 of its text."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class FAQIndexManager:
+    """Build the FAQ FAISS store once, persist it to disk and keep it in sync with the FAQ text.
+
+    Every chunk is stored under the hash of its text, so the docstore doubles as the
+    fingerprint store: on reload only new or edited chunks are embedded and chunks that
+    disappeared are removed from the index.
+
+    FAQ_INDEX_BACKEND picks the index (see vector_backends.py). "flat" is LangChain's FAISS
+    store, updated in place; any other backend is a CompactVectorStore, rebuilt on reload
+    from the saved vectors of unchanged chunks plus embeddings of the new ones.
+    """
+
+    def __init__(self, source_path, embeddings, index_dir=None, chunk_size=1000, chunk_overlap=200, use_mmap=None,
+                 backend=None):
+        self.source_path = source_path
+        self.embeddings = embeddings
+        self.index_dir = index_dir or os.getenv("FAQ_INDEX_DIR", "faq_index")
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        if use_mmap is None:
+            use_mmap = os.getenv("FAQ_INDEX_MMAP", "1") == "1"
+        self.use_mmap = use_mmap
+        self.backend = backend or os.getenv("FAQ_INDEX_BACKEND", "flat")
+        self._vectorstore = None
+        self._live_hash = None
+        self._source_mtime = None
+        self._lock = threading.Lock()
+        self._listeners = []
+        self._watcher = None
+
+    def source_hash(self):
+        """Hash the FAQ text together with everything that shapes the stored vectors."""
+        digest = hashlib.sha256()
+        with open(self.source_path, "rb") as f:
+            digest.update(f.read())
+        digest.update(json.dumps(self._index_config(), sort_keys=True).encode("utf-8"))
+        return digest.hexdigest()
+
+    def _index_config(self):
+        return {
+            "model": getattr(self.embeddings, "model_name", type(self.embeddings).__name__),
+            "chunk_size": self.chunk_size,
+            "chunk_overlap": self.chunk_overlap,
+            "backend": self.backend,
+        }
+
+    @property
+    def compact(self):
+        return self.backend != "flat"
+
+    @property
+    def loaded(self):
+        return self._vectorstore is not None
+
+    def get_vectorstore(self):
+        """Return the live vector store, loading or building it on first use."""
+        vectorstore = self._vectorstore
+        if vectorstore is not None:
+            return vectorstore
+        with self._lock:
+            if self._vectorstore is None:
+                self._refresh()
+            return self._vectorstore
+
+    def stored_is_current(self):
+        """True when the saved index was built from the current FAQ text, model and chunking."""
+        return self._stored_meta().get("source_hash") == self.source_hash()
+
+    def remap(self):
+        """Make the saved index the live store, memory-mapped when FAQ_INDEX_MMAP is on.
+
+        Called before forking workers so they all share the file's pages. It never builds or
+        embeds anything; returns False, leaving the live store alone, when the saved index is
+        missing or out of date.
+        """
+        with self._lock:
+            if not self.stored_is_current():
+                return False
+            self._source_mtime = os.path.getmtime(self.source_path)
+            self._publish(self._load(), self.source_hash())
+            return True
+
+    def add_reload_listener(self, callback):
+        """Register callback(vectorstore) to run after a new vector store goes live."""
+        self._listeners.append(callback)
+
+    def reload(self):
+        """Bring the index up to date with the FAQ text and swap it in if anything changed.
+
+        The update is applied to a copy of the live store, so requests that already hold
+        the current store keep using it undisturbed until the single reference swap.
+        Returns True when a new store was published.
+        """
+        with self._lock:
+            return self._refresh()
+
+    def start_watcher(self, interval=None):
+        """Poll the FAQ file in a daemon thread and hot-reload the index when it changes."""
+        if self._watcher is not None:
+            return self._watcher
+        if interval is None:
+            interval = float(os.getenv("FAQ_RELOAD_INTERVAL", "5"))
+
+        def watch():
+            while True:
+                time.sleep(interval)
+                try:
+                    if os.path.getmtime(self.source_path) != self._source_mtime:
+                        self.reload()
+                except Exception as e:
+                    print(f"Error reloading FAQ index: {str(e)}")
+
+        self._watcher = threading.Thread(target=watch, name="faq-index-watcher", daemon=True)
+        self._watcher.start()
+        return self._watcher
+
+    def _refresh(self):
+        self._source_mtime = os.path.getmtime(self.source_path)
+        current_hash = self.source_hash()
+        if self._vectorstore is not None and self._live_hash == current_hash:
+            return False
+
+        base = self._vectorstore
+        if base is None:
+            base = self._load_stored()
+            if base is not None and self._stored_meta().get("source_hash") == current_hash:
+                self._publish(base, current_hash)
+                return True
+
+        if base is None:
+            vectorstore = self._build()
+        elif self.compact:
+            vectorstore = self._build(reuse=base)
+        else:
+            vectorstore = self._update(self._copy(base))
+        self._save(vectorstore, current_hash)
+        self._publish(vectorstore, current_hash)
+        return True
+
+    def _publish(self, vectorstore, source_hash):
+        self._vectorstore = vectorstore
+        self._live_hash = source_hash
+        for callback in self._listeners:
+            try:
+                callback(vectorstore)
+            except Exception as e:
+                print(f"Error in FAQ index reload listener: {str(e)}")
+
+    def _split(self):
+        """Split the FAQ text into chunks and return (documents, fingerprint ids)."""
+        loader = TextLoader(self.source_path)
+        documents = loader.load()
+        text_splitter = RecursiveCharacterTextSplitter(
+            chunk_size=self.chunk_size,
+            chunk_overlap=self.chunk_overlap
+        )
+        chunks, ids, seen = [], [], set()
+        for chunk in text_splitter.split_documents(documents):
+            chunk_id = chunk_fingerprint(chunk.page_content)
+            # Identical chunks embed identically, one copy in the index is enough
+            if chunk_id in seen:
+                continue
+            seen.add(chunk_id)
+            chunks.append(chunk)
+            ids.append(chunk_id)
+        return chunks, ids
+
+    def _build(self, reuse=None):
+        start_time = time.time()
+        chunks, ids = self._split()
+        with span("index_build"):
+            if self.compact:
+                vectorstore = self._build_compact(chunks, ids, reuse)
+            else:
+                vectorstore = FAISS.from_documents(chunks, self.embeddings, ids=ids)
+        print(f"Built {self.backend} FAQ index ({len(ids)} chunks) in {time.time() - start_time:.2f} seconds")
+        return vectorstore
+
+    def _build_compact(self, chunks, ids, reuse=None):
+        known = reuse.vectors_by_id() if reuse is not None else {}
+        missing = [chunk for chunk, chunk_id in zip(chunks, ids) if chunk_id not in known]
+        if missing:
+            embedded = self.embeddings.embed_documents([chunk.page_content for chunk in missing])
+            known.update(zip((chunk_fingerprint(chunk.page_content) for chunk in missing), embedded))
+        if reuse is not None:
+            print(f"Rebuilding FAQ index: {len(missing)} embedded, {len(ids) - len(missing)} reused")
+        return CompactVectorStore.from_vectors([known[chunk_id] for chunk_id in ids], chunks, ids, self.backend)
+
+    def _update(self, vectorstore):
+        """Embed only new chunks and drop deleted ones from the given store in place."""
+        start_time = time.time()
+        chunks, ids = self._split()
+        wanted = dict(zip(ids, chunks))
+        existing = set(vectorstore.index_to_docstore_id.values())
+
+        removed = [chunk_id for chunk_id in existing if chunk_id not in wanted]
+        added = [chunk_id for chunk_id in ids if chunk_id not in existing]
+        if removed:
+            vectorstore.delete(removed)
+        if added:
+            vectorstore.add_documents([wanted[chunk_id] for chunk_id in added], ids=added)
+
+        print(f"Updated FAQ index: {len(added)} embedded, {len(removed)} removed, "
+              f"{len(ids) - len(added)} reused in {time.time() - start_time:.2f} seconds")
+        return vectorstore
+
+    def _copy(self, vectorstore):
+        # The live index may be a read-only memory map, so the copy is made in memory
+        return FAISS(
+            self.embeddings,
+            copy_index(vectorstore.index),
+            InMemoryDocstore(dict(vectorstore.docstore._dict)),
+            dict(vectorstore.index_to_docstore_id),
+        )
+
+    def _stored_meta(self):
+        try:
+            with open(os.path.join(self.index_dir, META_FILE)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _load_stored(self):
+        """Load the persisted store if it was built with the current model and chunking."""
+        meta = self._stored_meta()
+        if not meta or any(meta.get(key) != value for key, value in self._index_config().items()):
+            return None
+        try:
+            return self._load()
+        except Exception as e:
+            print(f"Error loading FAQ index, rebuilding: {str(e)}")
+            return None
+
+    def _save(self, vectorstore, source_hash):
+        os.makedirs(self.index_dir, exist_ok=True)
+        # Remove the marker first so a half-saved index is never mistaken for a valid one
+        meta_path = os.path.join(self.index_dir, META_FILE)
+        if os.path.exists(meta_path):
+            os.remove(meta_path)
+        # Written aside and moved into place, so a store still memory-mapping the old files
+        # keeps its pages instead of reading a truncated file
+        staging = os.path.join(self.index_dir, ".staging")
+        os.makedirs(staging, exist_ok=True)
+        if self.compact:
+            vectorstore.save(staging)
+            chunk_ids = vectorstore.ids
+        else:
+            vectorstore.save_local(staging)
+            chunk_ids = vectorstore.index_to_docstore_id.values()
+        for name in os.listdir(staging):
+            os.replace(os.path.join(staging, name), os.path.join(self.index_dir, name))
+        with open(meta_path, "w") as f:
+            json.dump({
+                "source_hash": source_hash,
+                "chunks": sorted(chunk_ids),
+                **self._index_config(),
+            }, f)
+
+    def _load(self):
+        with span("index_load"):
+            return self._read()
+
+    def _read(self):
+        if self.compact:
+            return CompactVectorStore.load(self.index_dir, self.backend, self.use_mmap)
+        index = read_index(os.path.join(self.index_dir, INDEX_FILE), self.use_mmap)
+        with open(os.path.join(self.index_dir, DOCSTORE_FILE), "rb") as f:
+            docstore, index_to_docstore_id = pickle.load(f)
+        return FAISS(self.embeddings, index, docstore, index_to_docstore_id)
@@ -0,0 +1,28 @@
+# Pre-fork serving mode: gunicorn -c gunicorn.conf.py app:app
+#
+# The app is imported once in the master (preload_app); prefork.prepare() then loads the
+# embedding model and memory-maps the FAISS indexes before any worker is forked, so adding
+# workers adds little memory. Check with: python prefork.py report --pidfile gunicorn.pid
+import os
+import multiprocessing
+
+# Read by app.py: background threads are started per worker in post_fork instead of at import
+os.environ["PREFORK"] = "1"
+
+bind = os.getenv("BIND", "0.0.0.0:5000")
+workers = int(os.getenv("WEB_WORKERS", str(multiprocessing.cpu_count())))
+worker_class = "gthread"
+threads = int(os.getenv("WEB_THREADS", "4"))
+timeout = int(os.getenv("WEB_TIMEOUT", "120"))
+preload_app = True
+pidfile = os.getenv("GUNICORN_PIDFILE", "gunicorn.pid")
+
+
+def when_ready(server):
+    import prefork
+    prefork.prepare()
+
+
+def post_fork(server, worker):
+    import prefork
+    prefork.after_fork()
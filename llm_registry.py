@@ -0,0 +1,90 @@
+import os
+import gc
+import threading
+import psutil
+
+
+class LLMRegistry:
+    """Process-wide registry that keeps LLM clients (and their HTTP sessions) warm across requests.
+
+    Clients are created on first use from a registered factory and shared by all threads.
+    They are only dropped when the host is under memory pressure, checked with psutil
+    against LLM_MEMORY_LIMIT_PERCENT (system memory in use) and LLM_RSS_LIMIT_MB
+    (this process's RSS, 0 disables the check).
+    """
+
+    def __init__(self, memory_limit_percent=None, rss_limit_mb=None):
+        self.memory_limit_percent = memory_limit_percent if memory_limit_percent is not None \
+            else float(os.getenv("LLM_MEMORY_LIMIT_PERCENT", "90"))
+        self.rss_limit_mb = rss_limit_mb if rss_limit_mb is not None else float(os.getenv("LLM_RSS_LIMIT_MB", "0"))
+        self._factories = {}
+        self._clients = {}
+        self._lock = threading.Lock()
+        self._process = None
+        self._process_pid = None
+        self.created = 0
+        self.released = 0
+
+    def register(self, name, factory):
+        """Register a zero-argument factory for the client called `name`."""
+        with self._lock:
+            self._factories[name] = factory
+            self._clients.pop(name, None)
+
+    def loaded(self, name):
+        return name in self._clients
+
+    def get(self, name):
+        client = self._clients.get(name)
+        if client is not None:
+            return client
+        with self._lock:
+            client = self._clients.get(name)
+            if client is None:
+                client = self._factories[name]()
+                self._clients[name] = client
+                self.created += 1
+            return client
+
+    def release(self, name=None):
+        """Drop one client, or all of them; they are recreated on next use."""
+        with self._lock:
+            names = [name] if name else list(self._clients)
+            for client_name in names:
+                if self._clients.pop(client_name, None) is not None:
+                    self.released += 1
+
+    def _current_process(self):
+        # The registry is created at import, in the pre-fork master; each worker measures itself
+        if self._process_pid != os.getpid():
+            self._process = psutil.Process()
+            self._process_pid = os.getpid()
+        return self._process
+
+    def memory_pressure(self):
+        if psutil.virtual_memory().percent >= self.memory_limit_percent:
+            return True
+        if self.rss_limit_mb and self._current_process().memory_info().rss >= self.rss_limit_mb * 1024 * 1024:
+            return True
+        return False
+
+    def maybe_release(self):
+        """Release all clients and collect garbage, but only when memory is actually tight."""
+        if not self.memory_pressure():
+            return False
+        print("Memory pressure detected, releasing LLM clients")
+        self.release()
+        gc.collect()
+        return True
+
+    def stats(self):
+        return {
+            "clients": sorted(self._clients),
+            "created": self.created,
+            "released": self.released,
+            "rss_mb": self._current_process().memory_info().rss / (1024 * 1024),
+            "system_memory_percent": psutil.virtual_memory().percent,
+        }
+
+
+registry = LLMRegistry()
@@ -0,0 +1,149 @@
+import os
+import time
+import bisect
+import threading
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+
+# Upper bounds (seconds) of the Prometheus histogram buckets
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class StageHistogram:
+    """Latency histogram for one stage: cumulative buckets plus a window of recent samples for percentiles."""
+
+    def __init__(self, window):
+        self.bucket_counts = [0] * len(BUCKETS)
+        self.count = 0
+        self.sum = 0.0
+        self.recent = deque(maxlen=window)
+
+    def observe(self, seconds):
+        index = bisect.bisect_left(BUCKETS, seconds)
+        if index < len(BUCKETS):
+            self.bucket_counts[index] += 1
+        self.count += 1
+        self.sum += seconds
+        self.recent.append(seconds)
+
+    def quantiles(self):
+        samples = sorted(self.recent)
+        if not samples:
+            return {q: 0.0 for q in QUANTILES}
+        return {q: samples[min(len(samples) - 1, int(q * len(samples)))] for q in QUANTILES}
+
+
+class RequestTimings:
+    """Per-request stage totals; spans from pitch worker threads add to it too."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages = {}
+        self._lock = threading.Lock()
+
+    def add(self, stage, seconds):
+        with self._lock:
+            self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def as_dict(self):
+        with self._lock:
+            timings = {stage: round(seconds, 6) for stage, seconds in self.stages.items()}
+        timings["total"] = round(time.perf_counter() - self.started, 6)
+        return timings
+
+
+_current = contextvars.ContextVar("request_timings", default=None)
+
+
+class Metrics:
+    """In-process latency metrics for the serving stages (embed, retrieve, llm, db_query, pitch, ...).
+
+    Nothing leaves the process: histograms are read through snapshot() or rendered in the
+    Prometheus text format by render_prometheus(). The window of recent samples used for
+    p50/p95/p99 holds METRICS_WINDOW observations per stage.
+    """
+
+    def __init__(self, window=None):
+        self.window = window or int(os.getenv("METRICS_WINDOW", "2048"))
+        self._stages = {}
+        self._lock = threading.Lock()
+
+    def observe(self, stage, seconds):
+        with self._lock:
+            histogram = self._stages.get(stage)
+            if histogram is None:
+                histogram = self._stages[stage] = StageHistogram(self.window)
+            histogram.observe(seconds)
+        timings = _current.get()
+        if timings is not None:
+            timings.add(stage, seconds)
+
+    @contextmanager
+    def span(self, stage):
+        """Time the enclosed block as one observation of `stage`."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def snapshot(self):
+        with self._lock:
+            stages = {stage: (h.count, h.sum, h.quantiles()) for stage, h in self._stages.items()}
+        return {
+            stage: {"count": count, "sum": total, **{f"p{int(q * 100)}": value for q, value in quantiles.items()}}
+            for stage, (count, total, quantiles) in stages.items()
+        }
+
+    def render_prometheus(self):
+        lines = [
+            "# HELP chatbot_stage_duration_seconds Time spent per serving stage.",
+            "# TYPE chatbot_stage_duration_seconds histogram",
+        ]
+        quantile_lines = [
+            "# HELP chatbot_stage_latency_seconds Recent per-stage latency percentiles.",
+            "# TYPE chatbot_stage_latency_seconds summary",
+        ]
+        with self._lock:
+            stages = sorted((stage, list(h.bucket_counts), h.count, h.sum, h.quantiles())
+                            for stage, h in self._stages.items())
+        for stage, bucket_counts, count, total, quantiles in stages:
+            cumulative = 0
+            for bound, bucket_count in zip(BUCKETS, bucket_counts):
+                cumulative += bucket_count
+                lines.append(f'chatbot_stage_duration_seconds_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+            lines.append(f'chatbot_stage_duration_seconds_bucket{{stage="{stage}",le="+Inf"}} {count}')
+            lines.append(f'chatbot_stage_duration_seconds_sum{{stage="{stage}"}} {total}')
+            lines.append(f'chatbot_stage_duration_seconds_count{{stage="{stage}"}} {count}')
+            for q, value in quantiles.items():
+                quantile_lines.append(f'chatbot_stage_latency_seconds{{stage="{stage}",quantile="{q}"}} {value}')
+            quantile_lines.append(f'chatbot_stage_latency_seconds_sum{{stage="{stage}"}} {total}')
+            quantile_lines.append(f'chatbot_stage_latency_seconds_count{{stage="{stage}"}} {count}')
+        return "\n".join(lines + quantile_lines) + "\n"
+
+    def reset(self):
+        with self._lock:
+            self._stages = {}
+
+
+metrics = Metrics()
+span = metrics.span
+observe = metrics.observe
+
+
+@contextmanager
+def track_request():
+    """Collect the stage timings of everything run in this context (and contexts copied from it)."""
+    timings = RequestTimings()
+    token = _current.set(timings)
+    try:
+        yield timings
+    finally:
+        _current.reset(token)
+
+
+def timings_requested(data):
+    """A request gets a `timings` breakdown when it asks for one or METRICS_TIMINGS=1."""
+    return bool((data or {}).get("timings")) or os.getenv("METRICS_TIMINGS") == "1"
@@ -0,0 +1,232 @@
+import os
+import json
+import asyncio
+import math
+import time
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from pitch_store import pitch_key
+from single_flight import SingleFlight, AsyncSingleFlight
+
+
+def pitch_mode():
+    """Return the configured pitch mode: "single" (one LLM call per product) or "batch"."""
+    return os.getenv("PITCH_MODE", "single")
+
+
+def build_batch_prompt(descriptions):
+    """Build one prompt asking for a one-sentence pitch for each numbered description."""
+    items = "\n\n".join(f"[{index}]\n{description}" for index, description in enumerate(descriptions))
+    return (f"The following are {len(descriptions)} product descriptions extracted from HTML pages, "
+            f"each preceded by its number in square brackets:\n\n"
+            f"{items}\n\n"
+            f"For each product, write a single, concise, and compelling pitch in one sentence. "
+            f"Focus on the key benefit and selling point without repeating.\n"
+            f"Respond with only a JSON array of objects, one per product, in the form "
+            f"[{{\"id\": 0, \"pitch\": \"...\"}}, ...].\n\nJSON:")
+
+
+def parse_batch_response(response, count):
+    """Parse a batch pitch response into a list of `count` pitches, None where an item is unusable."""
+    pitches = [None] * count
+    if not response or not isinstance(response, str):
+        return pitches
+    start, end = response.find("["), response.rfind("]")
+    if start == -1 or end <= start:
+        return pitches
+    try:
+        items = json.loads(response[start:end + 1])
+    except ValueError:
+        return pitches
+    if not isinstance(items, list):
+        return pitches
+
+    for position, item in enumerate(items):
+        if isinstance(item, dict):
+            index, pitch = item.get("id", position), item.get("pitch")
+        else:
+            index, pitch = position, item
+        if isinstance(index, str) and index.isdigit():
+            index = int(index)
+        if isinstance(index, int) and 0 <= index < count and isinstance(pitch, str) and pitch.strip():
+            pitches[index] = pitch.strip()
+    return pitches
+
+
+class PitchEngine:
+    """Generate the pitches for one product result set concurrently.
+
+    At most `max_workers` pitches run at once. A pitch that runs longer than `timeout`
+    seconds is abandoned and the product's short_description is used instead; results
+    are always returned in the order of the input products.
+
+    With a `store`, pitches already generated for the same product, description and
+    model are served from it and new ones are saved to it. Pitches listed in
+    `uncacheable` (the generator's error messages) are never saved.
+
+    In "batch" mode (see pitch_mode) all missing pitches of a result set go to
+    `generate_batch`, `batch_size` products per call; items it could not produce are
+    retried one by one.
+    """
+
+    def __init__(self, generate, max_workers=None, timeout=None, store=None, model_name=None, uncacheable=(),
+                 generate_batch=None, mode=None, batch_size=None):
+        self.generate = generate
+        self.generate_batch = generate_batch
+        self.mode = mode or pitch_mode()
+        self.batch_size = batch_size or int(os.getenv("PITCH_BATCH_SIZE", "5"))
+        self.store = store
+        self.model_name = model_name
+        self.uncacheable = set(uncacheable)
+        self.max_workers = max_workers or int(os.getenv("PITCH_WORKERS", "4"))
+        self.timeout = timeout if timeout is not None else float(os.getenv("PITCH_TIMEOUT", "20"))
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="pitch")
+        # Two requests pitching the same product at once share one LLM call
+        self.flight = SingleFlight("pitch", timeout=self.timeout)
+        self.aflight = AsyncSingleFlight("pitch_async", timeout=self.timeout)
+
+    def _submit(self, function, *args):
+        # Run in a copy of the caller's context so worker spans count towards its request timings
+        return self._executor.submit(contextvars.copy_context().run, function, *args)
+
+    @staticmethod
+    def fallback(product):
+        return product.get('short_description') or "No product description available."
+
+    def _save(self, product, pitch):
+        if self.store is not None and pitch and pitch not in self.uncacheable:
+            self.store.put(pitch_key(product, self.model_name), pitch)
+
+    def _generate(self, product):
+        pitch = self.generate(product.get('short_description'))
+        self._save(product, pitch)
+        return pitch
+
+    def iter_pitches(self, products):
+        """Yield (index, pitch) for each product as soon as its pitch is ready or has timed out."""
+        started = {}
+
+        def run(index, product):
+            started[index] = time.time()
+            return self.flight.do(pitch_key(product, self.model_name), lambda: self._generate(product))
+
+        def run_batch(indexes):
+            now = time.time()
+            for index in indexes:
+                started[index] = now
+            return self.generate_batch([products[index].get('short_description') for index in indexes])
+
+        # A future maps to a product index, or to a list of indexes for a batch call
+        futures, stored, missing = {}, [], []
+        for index, product in enumerate(products):
+            pitch = self.store.get(pitch_key(product, self.model_name)) if self.store is not None else None
+            if pitch is not None:
+                stored.append((index, pitch))
+            else:
+                missing.append(index)
+
+        if self.mode == "batch" and self.generate_batch is not None and len(missing) > 1:
+            for start in range(0, len(missing), self.batch_size):
+                group = missing[start:start + self.batch_size]
+                futures[self._submit(run_batch, group)] = group
+        else:
+            for index in missing:
+                futures[self._submit(run, index, products[index])] = index
+        # Everything that needs the LLM is already submitted before stored pitches are handed out
+        yield from stored
+
+        # Pitches still queued behind stuck workers are given up on after this
+        batch_deadline = time.time() + self.timeout * math.ceil(len(futures) / self.max_workers)
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, timeout=0.05, return_when=FIRST_COMPLETED)
+            for future in done:
+                key = futures[future]
+                if isinstance(key, list):
+                    try:
+                        results = future.result()
+                    except Exception as e:
+                        print(f"Error generating batch pitches: {str(e)}")
+                        results = []
+                    results = (list(results or []) + [None] * len(key))[:len(key)]
+                    retries = 0
+                    for index, pitch in zip(key, results):
+                        if pitch:
+                            self._save(products[index], pitch)
+                            yield index, pitch
+                        else:
+                            retry = self._submit(run, index, products[index])
+                            futures[retry] = index
+                            pending.add(retry)
+                            retries += 1
+                    if retries:
+                        print(f"Batch pitch response unusable for {retries} item(s), retrying them one by one")
+                        batch_deadline = max(batch_deadline,
+                                             time.time() + self.timeout * math.ceil(retries / self.max_workers))
+                    continue
+                try:
+                    yield key, future.result()
+                except Exception as e:
+                    print(f"Error generating pitch: {str(e)}")
+                    yield key, self.fallback(products[key])
+
+            now = time.time()
+            for future in list(pending):
+                key = futures[future]
+                indexes = key if isinstance(key, list) else [key]
+                start = started.get(indexes[0])
+                if (start is not None and now - start > self.timeout) or now > batch_deadline:
+                    # cancel() only drops queued work; a call already running holds its worker
+                    # until the LLM client's own timeout (PITCH_TIMEOUT in app.make_ollama) ends it
+                    future.cancel()
+                    pending.discard(future)
+                    print(f"Pitch timed out after {self.timeout}s, using the product description")
+                    for index in indexes:
+                        yield index, self.fallback(products[index])
+
+    def pitch_all(self, products):
+        """Return one pitch per product, in the same order as `products`."""
+        pitches = [None] * len(products)
+        for index, pitch in self.iter_pitches(products):
+            pitches[index] = pitch
+        return pitches
+
+    async def apitch_all(self, products, agenerate):
+        """Async variant of pitch_all for the ASGI server, using the coroutine `agenerate`.
+
+        Pitches run as tasks, at most `max_workers` at a time, with the same per-pitch
+        timeout, store lookups and fallback as the threaded path.
+        """
+        semaphore = asyncio.Semaphore(self.max_workers)
+
+        async def pitch(product):
+            key = pitch_key(product, self.model_name)
+            if self.store is not None:
+                # A memory-tier miss reads SQLite
+                stored = await asyncio.to_thread(self.store.get, key)
+                if stored is not None:
+                    return stored
+            async with semaphore:
+                try:
+                    result = await self.aflight.do(
+                        key, lambda: asyncio.wait_for(agenerate(product.get('short_description')), self.timeout))
+                except asyncio.TimeoutError:
+                    print(f"Pitch timed out after {self.timeout}s, using the product description")
+                    return self.fallback(product)
+                except Exception as e:
+                    print(f"Error generating pitch: {str(e)}")
+                    return self.fallback(product)
+            await asyncio.to_thread(self._save, product, result)
+            return result
+
+        return list(await asyncio.gather(*(pitch(product) for product in products)))
+
+    def warm(self, products, batch_size=50):
+        """Pre-generate and store pitches for every product that does not have one yet."""
+        missing = [product for product in products
+                   if product.get('short_description')
+                   and pitch_key(product, self.model_name) not in self.store]
+        for start in range(0, len(missing), batch_size):
+            self.pitch_all(missing[start:start + batch_size])
+            print(f"Warmed {min(start + batch_size, len(missing))}/{len(missing)} pitches")
+        return len(missing)
@@ -0,0 +1,62 @@
+import os
+import hashlib
+import sqlite3
+import threading
+from collections import OrderedDict
+
+
+def pitch_key(product, model_name):
+    """Key a pitch by product, the exact description it was written from and the model."""
+    product_id = product.get('url_key') or product.get('product_id')
+    description_hash = hashlib.sha256((product.get('short_description') or "").encode("utf-8")).hexdigest()
+    return f"{product_id}:{description_hash}:{model_name}"
+
+
+class PitchStore:
+    """Persistent pitch cache: an LRU memory tier in front of a local SQLite file."""
+
+    def __init__(self, path=None, memory_size=None):
+        self.path = path or os.getenv("PITCH_STORE_PATH", "pitch_store.sqlite3")
+        self.memory_size = memory_size or int(os.getenv("PITCH_CACHE_SIZE", "1024"))
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        self._pid = None
+        self._connection()
+
+    def _connection(self):
+        # A SQLite connection must not cross a fork; pre-forked workers open their own
+        if self._pid != os.getpid():
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.execute("CREATE TABLE IF NOT EXISTS pitches (key TEXT PRIMARY KEY, pitch TEXT NOT NULL)")
+            self._db.commit()
+            self._pid = os.getpid()
+        return self._db
+
+    def _remember(self, key, pitch):
+        self._memory[key] = pitch
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    def get(self, key):
+        with self._lock:
+            pitch = self._memory.get(key)
+            if pitch is not None:
+                self._memory.move_to_end(key)
+                return pitch
+            row = self._connection().execute("SELECT pitch FROM pitches WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            self._remember(key, row[0])
+            return row[0]
+
+    def put(self, key, pitch):
+        with self._lock:
+            db = self._connection()
+            db.execute("INSERT OR REPLACE INTO pitches (key, pitch) VALUES (?, ?)", (key, pitch))
+            db.commit()
+            self._remember(key, pitch)
+
+    def __contains__(self, key):
+        return self.get(key) is not None
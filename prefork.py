@@ -0,0 +1,111 @@
+"""Pre-fork serving: load the model and indexes once in the master, share them with every worker.
+
+Used by gunicorn.conf.py (`gunicorn -c gunicorn.conf.py app:app`). The master imports the
+app, constructs the embedding model and memory-maps the saved FAQ and product FAISS indexes
+read-only, then freezes the garbage collector so forked workers keep sharing those pages
+instead of copying them; `report` shows how many index files each process really maps.
+The master never embeds: a missing or stale FAQ index is built by a child process first.
+
+    python prefork.py report --pidfile gunicorn.pid   # RSS / USS / PSS and mapped indexes per worker
+"""
+import os
+import gc
+import sys
+import time
+import subprocess
+import psutil
+
+BUILD_FAQ_INDEX = "from FAQ import get_index_manager; get_index_manager().get_vectorstore()"
+
+
+def prepare():
+    """Load everything workers should share; runs in the master before the first fork."""
+    from FAQ import get_embeddings, get_index_manager, get_product_index
+
+    start_time = time.time()
+    # Only construct the model here: running it would start torch's thread pool, which
+    # does not survive a fork. Workers run their first embedding themselves.
+    get_embeddings()
+    manager = get_index_manager()
+    if not manager.remap():
+        # Building embeds the FAQ chunks, so it runs in a fresh interpreter that exits afterwards
+        print("Pre-fork: FAQ index missing or out of date, building it in a child process")
+        try:
+            subprocess.run([sys.executable, "-c", BUILD_FAQ_INDEX], check=True)
+        except Exception as e:
+            print(f"Error building FAQ index: {str(e)}")
+        if not manager.remap():
+            print("Pre-fork: no saved FAQ index, each worker will build its own on first use")
+    product_index = get_product_index()
+    product_index.get()
+    mapped = mapped_index_files(psutil.Process())
+    for index_dir, use_mmap in ((manager.index_dir, manager.use_mmap),
+                                (product_index.index_dir, product_index.use_mmap)):
+        path = os.path.realpath(os.path.join(index_dir, "index.faiss"))
+        if use_mmap and mapped is not None and os.path.exists(path) and path not in mapped:
+            print(f"Pre-fork: {path} is not memory-mapped, workers share it only as copy-on-write pages")
+    # Objects created so far are never collected, so the collector never writes to their pages
+    gc.collect()
+    gc.freeze()
+    print(f"Pre-fork: model and indexes loaded in {time.time() - start_time:.2f} seconds "
+          f"(master RSS {psutil.Process().memory_info().rss / 1e6:.0f} MB)")
+
+
+def after_fork():
+    """Per-worker setup after the fork: restart the background threads the master does not pass on."""
+    import app
+    app.start_background_tasks()
+
+
+def mapped_index_files(process):
+    """Paths of the FAISS index files mapped into a process; None where /proc/<pid>/maps is unavailable."""
+    try:
+        return {os.path.realpath(region.path) for region in process.memory_maps() if region.path.endswith(".faiss")}
+    except (psutil.AccessDenied, AttributeError):
+        return None
+
+
+def process_memory(process):
+    """RSS, USS and PSS in MB for one process (USS/PSS need /proc/<pid>/smaps, i.e. Linux)."""
+    try:
+        info = process.memory_full_info()
+        memory = {"rss_mb": info.rss / 1e6, "uss_mb": info.uss / 1e6, "pss_mb": getattr(info, "pss", 0) / 1e6}
+    except (psutil.AccessDenied, AttributeError):
+        memory = {"rss_mb": process.memory_info().rss / 1e6, "uss_mb": None, "pss_mb": None}
+    mapped = mapped_index_files(process)
+    return {"pid": process.pid, **memory, "mapped_indexes": len(mapped) if mapped is not None else None}
+
+
+def memory_report(master_pid):
+    """Memory of the master and each of its workers; the sum of PSS is the real footprint."""
+    master = psutil.Process(master_pid)
+    rows = [{"role": "master", **process_memory(master)}]
+    rows += [{"role": "worker", **process_memory(child)} for child in master.children()]
+    return rows
+
+
+def print_report(rows):
+    print(f"{'role':<8} {'pid':>8} {'rss MB':>9} {'uss MB':>9} {'pss MB':>9} {'indexes':>8}")
+    for row in rows:
+        values = [f"{row[key]:9.1f}" if row[key] is not None else f"{'-':>9}" for key in ("rss_mb", "uss_mb", "pss_mb")]
+        mapped = row["mapped_indexes"] if row["mapped_indexes"] is not None else "-"
+        print(f"{row['role']:<8} {row['pid']:>8} {' '.join(values)} {mapped:>8}")
+    workers = [row for row in rows if row["role"] == "worker"]
+    if any(row["mapped_indexes"] == 0 for row in workers):
+        print("\nSome workers map no FAISS index file: their indexes are private or copy-on-write copies")
+    if workers and all(row["pss_mb"] is not None for row in rows):
+        print(f"\n{len(workers)} workers, total PSS {sum(row['pss_mb'] for row in rows):.0f} MB, "
+              f"private per worker (USS) {sum(row['uss_mb'] for row in workers) / len(workers):.0f} MB")
+
+
+if __name__ == "__main__":
+    # python prefork.py report --pidfile gunicorn.pid | --pid 1234
+    args = sys.argv[1:]
+    if not args or args[0] != "report" or len(args) != 3 or args[1] not in ("--pid", "--pidfile"):
+        sys.exit("Usage: python prefork.py report --pidfile gunicorn.pid | --pid MASTER_PID")
+    if args[1] == "--pidfile":
+        with open(args[2]) as f:
+            pid = int(f.read().strip())
+    else:
+        pid = int(args[2])
+    print_report(memory_report(pid))
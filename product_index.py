@@ -0,0 +1,153 @@
+import os
+import sys
+import time
+import threading
+import numpy as np
+import faiss
+from langchain_core.documents import Document
+from db_pool import get_db_connection
+from text_clean import html_to_text
+from vector_backends import ChunkTable, build_index, read_index
+from metrics import span
+
+INDEX_FILE = "index.faiss"
+
+# Keyset-paginated export of active products, parameters are (last product_id, batch size)
+EXPORT_QUERY = """
+    SELECT pf.product_id, pf.name, pf.short_description, pf.description, pf.url_key
+    FROM ecommerce.product_flat pf
+    WHERE pf.status = 1 AND pf.product_id > %s
+    ORDER BY pf.product_id
+    LIMIT %s
+"""
+
+
+def product_text(product):
+    """The text embedded for a product: its name plus the plain-text descriptions."""
+    parts = [product.get("name") or "", html_to_text(product.get("short_description")),
+             html_to_text(product.get("description"))]
+    return "\n".join(part for part in parts if part)
+
+
+class ProductIndex:
+    """Semantic search over the product catalog, built offline and loaded read-only at runtime.
+
+    Vectors are L2-normalized all-MiniLM-L6-v2 embeddings in an inner-product FAISS index
+    (PRODUCT_INDEX_BACKEND, see vector_backends.py), so scores are cosine similarities.
+    Per-product fields live in a ChunkTable indexed by FAISS row rather than in one Python
+    object per product.
+    """
+
+    def __init__(self, embeddings, index_dir=None, min_score=None, use_mmap=None, backend=None):
+        self.embeddings = embeddings
+        self.index_dir = index_dir or os.getenv("PRODUCT_INDEX_DIR", "product_index")
+        self.min_score = min_score if min_score is not None else float(os.getenv("PRODUCT_MIN_SCORE", "0.35"))
+        if use_mmap is None:
+            use_mmap = os.getenv("PRODUCT_INDEX_MMAP", "1") == "1"
+        self.use_mmap = use_mmap
+        self.backend = backend or os.getenv("PRODUCT_INDEX_BACKEND", "flat")
+        self._state = None  # (faiss index, ChunkTable with product_id, name, url_key, snippet)
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def _export_batches(self, batch_size):
+        last_id = 0
+        while True:
+            conn = get_db_connection()
+            cur = None
+            try:
+                cur = conn.cursor(dictionary=True)
+                cur.execute(EXPORT_QUERY, (last_id, batch_size))
+                rows = cur.fetchall()
+            finally:
+                if cur is not None:
+                    cur.close()
+                conn.close()
+            if not rows:
+                return
+            # product_flat can hold several rows per product; keep the first
+            seen, batch = set(), []
+            for row in rows:
+                if row["product_id"] not in seen:
+                    seen.add(row["product_id"])
+                    batch.append(row)
+            yield batch
+            last_id = rows[-1]["product_id"]
+
+    def build(self, batch_size=256):
+        """Export active products in batches, embed each batch in one call and save the index."""
+        start_time = time.time()
+        vectors, fields = [], {"product_id": [], "name": [], "url_key": [], "snippet": []}
+        for batch in self._export_batches(batch_size):
+            texts = [product_text(product) for product in batch]
+            vectors.append(np.asarray(self.embeddings.embed_documents(texts), dtype=np.float32))
+            for product, text in zip(batch, texts):
+                fields["product_id"].append(product["product_id"])
+                fields["name"].append(product.get("name") or "")
+                fields["url_key"].append(product.get("url_key") or "")
+                fields["snippet"].append(text[:300])
+            print(f"Embedded {len(fields['product_id'])} products")
+
+        if not vectors:
+            raise Exception("No active products to index")
+        matrix = np.vstack(vectors)
+        faiss.normalize_L2(matrix)
+        index = build_index(matrix, self.backend)
+        table = ChunkTable.from_columns(fields)
+
+        os.makedirs(self.index_dir, exist_ok=True)
+        faiss.write_index(index, os.path.join(self.index_dir, INDEX_FILE))
+        table.save(self.index_dir)
+        with self._lock:
+            self._state = (index, table)
+            self._loaded = True
+        print(f"Built {self.backend} product index ({index.ntotal} products) in {time.time() - start_time:.2f} seconds")
+
+    def _load(self):
+        index_path = os.path.join(self.index_dir, INDEX_FILE)
+        if not os.path.exists(index_path):
+            return None
+        return read_index(index_path, self.use_mmap), ChunkTable.load(self.index_dir, self.use_mmap)
+
+    def get(self):
+        """Return (index, table), loading them on first use; None when no index was built."""
+        if not self._loaded:
+            with self._lock:
+                if not self._loaded:
+                    try:
+                        with span("product_index_load"):
+                            self._state = self._load()
+                    except Exception as e:
+                        print(f"Error loading product index: {str(e)}")
+                    self._loaded = True
+        return self._state
+
+    def search(self, query_vector, k=3):
+        """Return up to k products scoring at least `min_score` for an already computed query vector."""
+        state = self.get()
+        if state is None:
+            return []
+        index, table = state
+        query = np.asarray([query_vector], dtype=np.float32)
+        faiss.normalize_L2(query)
+        scores, rows = index.search(query, k)
+        return [
+            {**table.row(int(row)), "score": float(score)}
+            for score, row in zip(scores[0], rows[0])
+            if row != -1 and score >= self.min_score
+        ]
+
+    @staticmethod
+    def as_documents(products):
+        """Product hits as context documents for the FAQ prompt."""
+        return [Document(page_content=f"Product: {product['name']}\n{product['snippet']}",
+                         metadata={"product_id": product["product_id"]})
+                for product in products]
+
+
+if __name__ == "__main__":
+    # python product_index.py build   -> embed the active catalog offline and write product_index/
+    if sys.argv[1:] != ["build"]:
+        sys.exit("Usage: python product_index.py build")
+    from FAQ import get_embeddings
+    ProductIndex(get_embeddings()).build(batch_size=int(os.getenv("PRODUCT_INDEX_BATCH", "256")))
@@ -0,0 +1,194 @@
+import os
+import sys
+from db_pool import get_db_connection
+from facet_index import COLOR_ATTRIBUTE_ID, SIZE_ATTRIBUTE_ID, get_facet_index
+
+DEFAULT_PAGE_SIZE = 5
+MAX_PAGE_SIZE = 50
+
+# Columns callers may ask for; anything else would mean pulling the full HTML description by accident
+PROJECTABLE_COLUMNS = ("product_id", "name", "short_description", "description", "url_key", "price")
+DEFAULT_COLUMNS = ("product_id", "name", "short_description", "url_key")
+
+# Step 1: resolve matching product ids only, in id order so the last id is the next page's cursor.
+# Each facet accepts several values, so any combination of them is still a single query.
+PRODUCT_ID_QUERY = """
+    SELECT DISTINCT pc.product_id
+    FROM ecommerce.product_categories pc
+    JOIN ecommerce.product_attribute_values color_attr
+        ON color_attr.product_id = pc.product_id
+        AND color_attr.attribute_id = {color_attribute}
+        AND color_attr.integer_value IN ({colors})
+    JOIN ecommerce.product_attribute_values size_attr
+        ON size_attr.product_id = pc.product_id
+        AND size_attr.attribute_id = {size_attribute}
+        AND size_attr.integer_value IN ({sizes})
+    JOIN ecommerce.product_flat pf
+        ON pf.product_id = pc.product_id
+        AND pf.status = 1
+    WHERE pc.category_id IN ({categories})
+        AND pc.product_id > %s
+    ORDER BY pc.product_id
+    LIMIT %s
+"""
+
+# Indexes that let every join above be resolved from an index (checked with EXPLAIN below)
+RECOMMENDED_INDEXES = [
+    ("product_categories", "idx_pc_category_product", "(category_id, product_id)"),
+    ("product_attribute_values", "idx_pav_attribute_value_product", "(attribute_id, integer_value, product_id)"),
+    ("product_flat", "idx_pf_product_status", "(product_id, status)"),
+]
+
+
+def clamp_page_size(page_size):
+    try:
+        page_size = int(page_size) if page_size is not None else DEFAULT_PAGE_SIZE
+    except (TypeError, ValueError):
+        page_size = DEFAULT_PAGE_SIZE
+    return max(1, min(page_size, MAX_PAGE_SIZE))
+
+
+def as_ids(value):
+    """Accept a single id or a list of ids for a facet."""
+    if isinstance(value, (list, tuple, set)):
+        return [int(item) for item in value]
+    return [int(value)] if value else []
+
+
+def id_query(category_ids, size_ids, color_ids, cursor, page_size):
+    """Return the step-1 query and its parameters for lists of category, size and color ids."""
+    category_ids, size_ids, color_ids = as_ids(category_ids), as_ids(size_ids), as_ids(color_ids)
+    query = PRODUCT_ID_QUERY.format(
+        color_attribute=COLOR_ATTRIBUTE_ID,
+        size_attribute=SIZE_ATTRIBUTE_ID,
+        colors=", ".join(["%s"] * len(color_ids)),
+        sizes=", ".join(["%s"] * len(size_ids)),
+        categories=", ".join(["%s"] * len(category_ids)),
+    )
+    # One extra row tells us whether there is another page
+    return query, (*color_ids, *size_ids, *category_ids, int(cursor or 0), page_size + 1)
+
+
+def projection_query(ids, columns=DEFAULT_COLUMNS):
+    """Step 2: fetch only the requested columns for a page of ids."""
+    unknown = [column for column in columns if column not in PROJECTABLE_COLUMNS]
+    if unknown:
+        raise ValueError(f"Unknown product columns: {', '.join(unknown)}")
+    if "product_id" not in columns:
+        columns = ("product_id",) + tuple(columns)
+    placeholders = ", ".join(["%s"] * len(ids))
+    query = (f"SELECT {', '.join('pf.' + column for column in columns)} "
+             f"FROM ecommerce.product_flat pf "
+             f"WHERE pf.status = 1 AND pf.product_id IN ({placeholders})")
+    return query, tuple(ids)
+
+
+def paginate(id_rows, page_size):
+    """Turn the id query's rows into (ids for this page, next cursor or None)."""
+    ids = [row["product_id"] if isinstance(row, dict) else row[0] for row in id_rows]
+    if len(ids) > page_size:
+        ids = ids[:page_size]
+        return ids, ids[-1]
+    return ids, None
+
+
+def index_page(index, category_ids, size_ids, color_ids, cursor, page_size):
+    """Keyset pagination over the facet index's sorted id array."""
+    ids = index.query(as_ids(category_ids), as_ids(size_ids), as_ids(color_ids))
+    ids = ids[ids > int(cursor or 0)][:page_size + 1]
+    return paginate([(int(product_id),) for product_id in ids], page_size)
+
+
+def order_by_ids(rows, ids):
+    """product_flat can hold several rows per product (channel/locale); keep the first, in id order."""
+    by_id = {}
+    for row in rows:
+        by_id.setdefault(row["product_id"], row)
+    return [by_id[product_id] for product_id in ids if product_id in by_id]
+
+
+def _execute(query, params):
+    conn = get_db_connection()
+    cur = None
+    try:
+        cur = conn.cursor(dictionary=True)
+        cur.execute(query, params)
+        return cur.fetchall()
+    finally:
+        if cur is not None:
+            cur.close()
+        conn.close()
+
+
+def search_product_ids(category_ids, size_ids, color_ids, cursor=None, page_size=None):
+    """Return (product ids, next cursor) for one page of active products matching any of the
+    given ids in every facet.
+
+    Served from the in-memory facet index when it is available, otherwise from MySQL.
+    """
+    page_size = clamp_page_size(page_size)
+    index = get_facet_index()
+    if index is not None:
+        return index_page(index, category_ids, size_ids, color_ids, cursor, page_size)
+    return paginate(_execute(*id_query(category_ids, size_ids, color_ids, cursor, page_size)), page_size)
+
+
+def search_products(category_ids, size_ids, color_ids, cursor=None, page_size=None, columns=DEFAULT_COLUMNS):
+    """Return (products, next cursor) for one page, fetching only `columns` for each product.
+
+    Each facet takes a single id or a list of ids.
+    """
+    ids, next_cursor = search_product_ids(category_ids, size_ids, color_ids, cursor, page_size)
+    if not ids:
+        return [], None
+    query, params = projection_query(ids, columns)
+    return order_by_ids(_execute(query, params), ids), next_cursor
+
+
+def facet_summary(category_ids, size_ids, color_ids):
+    """Per-value match counts for each facet of a search, or None without the facet index."""
+    index = get_facet_index()
+    if index is None:
+        return None
+    return index.facet_counts(as_ids(category_ids), as_ids(size_ids), as_ids(color_ids))
+
+
+def create_index_statements():
+    return [f"CREATE INDEX {name} ON ecommerce.{table} {columns};" for table, name, columns in RECOMMENDED_INDEXES]
+
+
+def explain_search(category_id, size_id, color_id):
+    """Run EXPLAIN on the id query and return (plan rows, problems) for a MySQL server.
+
+    A problem is any table read with a full scan (type ALL) or without a usable key.
+    """
+    query, params = id_query(category_id, size_id, color_id, 0, DEFAULT_PAGE_SIZE)
+    rows = _execute("EXPLAIN " + query, params)
+    problems = [
+        f"{row.get('table')}: type={row.get('type')} key={row.get('key')}"
+        for row in rows
+        if row.get("type") == "ALL" or not row.get("key")
+    ]
+    return rows, problems
+
+
+if __name__ == "__main__":
+    # python product_search.py indexes            -> print the recommended index DDL
+    # python product_search.py explain CAT SIZE COLOR -> check the plan against a live MySQL
+    command = sys.argv[1] if len(sys.argv) > 1 else "indexes"
+    if command == "indexes":
+        print("\n".join(create_index_statements()))
+    elif command == "explain":
+        if os.getenv("MYSQL_FAKE") == "1":
+            sys.exit("EXPLAIN checks need a real MySQL server (unset MYSQL_FAKE).")
+        category_id, size_id, color_id = (int(value) for value in sys.argv[2:5])
+        plan, problems = explain_search(category_id, size_id, color_id)
+        for row in plan:
+            print(row)
+        if problems:
+            print("\nMissing indexes detected:\n  " + "\n  ".join(problems))
+            print("\nRecommended:\n" + "\n".join(create_index_statements()))
+            sys.exit(1)
+        print("\nAll joins are index-backed.")
+    else:
+        sys.exit(f"Unknown command: {command}")
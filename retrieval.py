@@ -0,0 +1,115 @@
+import os
+import threading
+import numpy as np
+from text_clean import estimate_tokens, truncate_tokens
+
+# FAQ chunk size and overlap in characters, picked with FAQ_CHUNK_PROFILE
+CHUNKING_PROFILES = {
+    "default": (1000, 200),
+    "compact": (500, 100),
+    "fine": (250, 50),
+}
+
+
+def chunking_profile(name=None):
+    """(chunk_size, chunk_overlap) of a profile; FAQ_CHUNK_SIZE / FAQ_CHUNK_OVERLAP override it."""
+    name = name or os.getenv("FAQ_CHUNK_PROFILE", "default")
+    if name not in CHUNKING_PROFILES:
+        raise ValueError(f"Unknown chunking profile {name!r}, expected one of {', '.join(CHUNKING_PROFILES)}")
+    chunk_size, chunk_overlap = CHUNKING_PROFILES[name]
+    return int(os.getenv("FAQ_CHUNK_SIZE", chunk_size)), int(os.getenv("FAQ_CHUNK_OVERLAP", chunk_overlap))
+
+
+def scored_search(vectorstore, query_vector, k):
+    """[(Document, cosine similarity)] for the k nearest chunks, best first.
+
+    LangChain's FAISS store returns squared L2 distances; for unit vectors (all-MiniLM-L6-v2
+    normalizes its output) that is 2 - 2 * cosine. A CompactVectorStore already scores by cosine.
+    """
+    query = np.asarray(query_vector, dtype=np.float32)
+    norm = np.linalg.norm(query)
+    if norm:
+        query = query / norm
+    results = vectorstore.similarity_search_with_score_by_vector(query.tolist(), k=k)
+    if getattr(vectorstore, "distance_strategy", None) is not None:
+        results = [(document, 1.0 - float(distance) / 2) for document, distance in results]
+    return results
+
+
+class RetrievalPolicy:
+    """Decide which retrieved documents go into the prompt.
+
+    Up to `max_k` FAQ chunks (RETRIEVAL_MAX_K) are searched. A chunk is kept when its cosine
+    similarity is at least `min_score` (RETRIEVAL_MIN_SCORE) and within `margin`
+    (RETRIEVAL_SCORE_MARGIN) of the best chunk, best first, and product documents follow,
+    until the context holds `token_budget` (CONTEXT_TOKEN_BUDGET) estimated tokens. A
+    question with no chunk and no product above its threshold is out of scope and is answered
+    without context.
+
+    Off by default (RETRIEVAL_ADAPTIVE=1 turns it on): with these thresholds
+    benchmarks/eval_retrieval.py shows answer support falling from 1.00 to 0.73 (default
+    profile) and 0.67 (compact), and no setting tried kept support at 1.00 while saving
+    tokens. Those runs used the fake embeddings, so tune the thresholds on all-MiniLM-L6-v2
+    until support holds before enabling it.
+    """
+
+    def __init__(self, max_k=None, min_score=None, margin=None, token_budget=None, adaptive=None):
+        self.max_k = max_k or int(os.getenv("RETRIEVAL_MAX_K", "4"))
+        self.min_score = min_score if min_score is not None else float(os.getenv("RETRIEVAL_MIN_SCORE", "0.2"))
+        self.margin = margin if margin is not None else float(os.getenv("RETRIEVAL_SCORE_MARGIN", "0.25"))
+        self.token_budget = token_budget or int(os.getenv("CONTEXT_TOKEN_BUDGET", "800"))
+        if adaptive is None:
+            adaptive = os.getenv("RETRIEVAL_ADAPTIVE", "0") == "1"
+        self.adaptive = adaptive
+        self._lock = threading.Lock()
+        self._counts = {"questions": 0, "out_of_scope": 0, "chunks": 0, "context_tokens": 0, "truncated": 0}
+
+    def select(self, scored, extra=()):
+        """Context documents from scored FAQ chunks plus `extra` (already filtered) product documents."""
+        if not self.adaptive:
+            context = [document for document, _ in scored] + list(extra)
+            self._record(context, len(scored), False)
+            return context
+
+        best = scored[0][1] if scored else 0.0
+        candidates = [document for document, score in scored
+                      if score >= self.min_score and score >= best - self.margin]
+        chunks = len(candidates)
+        context, used, truncated = [], 0, False
+        for document in candidates + list(extra):
+            tokens = estimate_tokens(document.page_content)
+            if used + tokens > self.token_budget:
+                # The best document is always kept, cut down to the budget if it has to be
+                if not context:
+                    document = type(document)(page_content=truncate_tokens(document.page_content, self.token_budget),
+                                              metadata=document.metadata)
+                    context.append(document)
+                    truncated = True
+                break
+            context.append(document)
+            used += tokens
+        self._record(context, min(chunks, len(context)), truncated)
+        return context
+
+    def _record(self, context, chunks, truncated):
+        with self._lock:
+            self._counts["questions"] += 1
+            self._counts["out_of_scope"] += not context
+            self._counts["chunks"] += chunks
+            self._counts["context_tokens"] += sum(estimate_tokens(document.page_content) for document in context)
+            self._counts["truncated"] += truncated
+
+    def stats(self):
+        with self._lock:
+            counts = dict(self._counts)
+        questions = counts["questions"]
+        return {
+            **counts,
+            "mean_chunks": counts["chunks"] / questions if questions else 0.0,
+            "mean_context_tokens": counts["context_tokens"] / questions if questions else 0.0,
+            "adaptive": self.adaptive,
+            "max_k": self.max_k,
+            "min_score": self.min_score,
+            "margin": self.margin,
+            "token_budget": self.token_budget,
+        }
@@ -0,0 +1,84 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+import numpy as np
+
+
+class SemanticCache:
+    """Answer cache looked up by cosine similarity of query embeddings.
+
+    Entries expire after `ttl` seconds and the least recently used entry is evicted once
+    `max_entries` is reached. Vectors are kept in a NumPy matrix so a lookup is a single
+    matrix-vector product.
+    """
+
+    def __init__(self, threshold=None, ttl=None, max_entries=None):
+        self.threshold = threshold if threshold is not None else float(os.getenv("FAQ_CACHE_THRESHOLD", "0.92"))
+        self.ttl = ttl if ttl is not None else float(os.getenv("FAQ_CACHE_TTL", "3600"))
+        self.max_entries = max_entries if max_entries is not None else int(os.getenv("FAQ_CACHE_SIZE", "512"))
+        self._entries = OrderedDict()  # key -> (unit vector, answer, stored_at)
+        self._next_key = 0
+        self._matrix = None
+        self._matrix_keys = []
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _normalize(vector):
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def lookup(self, vector):
+        """Return the cached answer for the most similar stored query, or None."""
+        query = self._normalize(vector)
+        with self._lock:
+            self._expire()
+            if self._entries:
+                if self._matrix is None:
+                    self._matrix_keys = list(self._entries)
+                    self._matrix = np.stack([self._entries[key][0] for key in self._matrix_keys])
+                scores = self._matrix @ query
+                best = int(np.argmax(scores))
+                if scores[best] >= self.threshold:
+                    key = self._matrix_keys[best]
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return self._entries[key][1]
+            self.misses += 1
+            return None
+
+    def store(self, vector, answer):
+        with self._lock:
+            self._entries[self._next_key] = (self._normalize(vector), answer, time.time())
+            self._next_key += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._matrix = None
+
+    def clear(self):
+        """Drop every entry, e.g. after the FAQ index was rebuilt."""
+        with self._lock:
+            self._entries.clear()
+            self._matrix = None
+
+    def _expire(self):
+        cutoff = time.time() - self.ttl
+        expired = [key for key, (_, _, stored_at) in self._entries.items() if stored_at < cutoff]
+        for key in expired:
+            del self._entries[key]
+        if expired:
+            self._matrix = None
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "miss_rate": self.misses / lookups if lookups else 0.0,
+            }
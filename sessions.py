@@ -0,0 +1,302 @@
+import os
+import re
+import sys
+import json
+import time
+import sqlite3
+import secrets
+import threading
+from collections import OrderedDict
+from text_clean import CHARS_PER_TOKEN, estimate_tokens, truncate_tokens
+
+# Random bytes in a session id; ids are issued by the server and double as the access key
+SESSION_ID_BYTES = 24
+
+
+class Session:
+    """One conversation: the most recent turns verbatim plus a running summary of older ones."""
+
+    __slots__ = ("summary", "turns", "updated_at")
+
+    def __init__(self, summary="", turns=None, updated_at=None):
+        self.summary = summary
+        self.turns = turns or []  # [(role, text)], oldest first
+        self.updated_at = updated_at or time.time()
+
+    def __len__(self):
+        return len(self.turns)
+
+    def copy(self):
+        return Session(self.summary, list(self.turns), self.updated_at)
+
+    def tokens(self):
+        return estimate_tokens(self.summary) + sum(estimate_tokens(text) for _, text in self.turns)
+
+    def nbytes(self):
+        """Approximate memory held by this session's Python objects."""
+        return (sys.getsizeof(self) + sys.getsizeof(self.summary) + sys.getsizeof(self.turns)
+                + sum(sys.getsizeof(turn) + sys.getsizeof(turn[0]) + sys.getsizeof(turn[1]) for turn in self.turns))
+
+    def as_dict(self):
+        return {"summary": self.summary, "turns": [{"role": role, "content": text} for role, text in self.turns],
+                "tokens": self.tokens(), "updated_at": self.updated_at}
+
+
+def _tail_tokens(text, max_tokens):
+    """Keep roughly the last `max_tokens` tokens of text, from a word boundary."""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    cut = text[-max_tokens * CHARS_PER_TOKEN:]
+    space = cut.find(" ")
+    return "..." + (cut[space + 1:] if space >= 0 else cut)
+
+
+def _first_sentence(text):
+    match = re.match(r"(.+?[.!?])(\s|$)", text.strip(), re.S)
+    return match.group(1) if match else text.strip()
+
+
+class HistoryCompactor:
+    """Keep a session's history bounded.
+
+    Each turn is cut to `turn_tokens` (SESSION_TURN_TOKENS). Once there are more than
+    `max_turns` turns (SESSION_HISTORY_TURNS) or they exceed `max_tokens`
+    (SESSION_HISTORY_TOKENS), the oldest question/answer pair is folded into the summary as
+    the question plus the answer's first sentence. The summary keeps its newest
+    `summary_tokens` (SESSION_SUMMARY_TOKENS). No LLM call is involved.
+    """
+
+    def __init__(self, max_turns=None, max_tokens=None, summary_tokens=None, turn_tokens=None):
+        self.max_turns = max_turns or int(os.getenv("SESSION_HISTORY_TURNS", "6"))
+        self.max_tokens = max_tokens or int(os.getenv("SESSION_HISTORY_TOKENS", "400"))
+        self.summary_tokens = summary_tokens or int(os.getenv("SESSION_SUMMARY_TOKENS", "120"))
+        self.turn_tokens = turn_tokens or int(os.getenv("SESSION_TURN_TOKENS", "150"))
+
+    def add(self, session, question, answer):
+        """Append one exchange and compact; returns how many exchanges were folded into the summary."""
+        session.turns.append(("user", truncate_tokens(question, self.turn_tokens)))
+        session.turns.append(("assistant", truncate_tokens(answer, self.turn_tokens)))
+        folded = 0
+        # The latest exchange always stays verbatim
+        while len(session.turns) > 2 and (len(session.turns) > self.max_turns or session.tokens() > self.max_tokens):
+            (_, asked), (_, answered) = session.turns[:2]
+            del session.turns[:2]
+            note = f"Q: {asked} A: {_first_sentence(answered)}"
+            session.summary = _tail_tokens(f"{session.summary} {note}".strip(), self.summary_tokens)
+            folded += 1
+        session.updated_at = time.time()
+        return folded
+
+
+def history_block(session):
+    """The conversation so far, formatted for the FAQ prompt; empty without history."""
+    if not session:
+        return ""
+    lines = [f"Earlier in this conversation: {session.summary}"] if session.summary else []
+    lines += [f"{'User' if role == 'user' else 'Assistant'}: {text}" for role, text in session.turns]
+    return "Conversation so far:\n    " + "\n    ".join(lines) + "\n"
+
+
+def retrieval_query(session, question):
+    """Text to embed for retrieval: a follow-up ("and for kids?") is searched together with the previous question."""
+    if not session:
+        return question
+    previous = next((text for role, text in reversed(session.turns) if role == "user"), "")
+    return f"{previous} {question}".strip()
+
+
+class MemorySessionStore:
+    """Sessions in process memory, in LRU order.
+
+    Only ids handed out by create() are known: they are unguessable, so holding one is what
+    gives access to its conversation. Sessions idle for `ttl` seconds (SESSION_TTL) expire and the least recently used one is
+    evicted past `max_sessions` (SESSION_MAX). Each worker process has its own sessions, so
+    use the SQLite store when several workers serve the same clients.
+    """
+
+    backend = "memory"
+
+    def __init__(self, ttl=None, max_sessions=None, compactor=None):
+        self.ttl = ttl if ttl is not None else float(os.getenv("SESSION_TTL", "1800"))
+        self.max_sessions = max_sessions or int(os.getenv("SESSION_MAX", "10000"))
+        self.compactor = compactor or HistoryCompactor()
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+        self._counts = {"appends": 0, "compactions": 0, "expired": 0, "evicted": 0}
+
+    def _expire(self):
+        cutoff = time.time() - self.ttl
+        while self._sessions:
+            session_id, session = next(iter(self._sessions.items()))
+            if session.updated_at >= cutoff:
+                break
+            del self._sessions[session_id]
+            self._counts["expired"] += 1
+
+    def create(self):
+        """Start an empty conversation and return its new id."""
+        session_id = secrets.token_urlsafe(SESSION_ID_BYTES)
+        with self._lock:
+            self._expire()
+            self._sessions[session_id] = Session()
+            self._evict()
+        return session_id
+
+    def _evict(self):
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+            self._counts["evicted"] += 1
+
+    def history(self, session_id):
+        """A copy of the session, or None for an id that was never issued or has expired."""
+        if not isinstance(session_id, str):
+            return None
+        with self._lock:
+            self._expire()
+            session = self._sessions.get(session_id)
+            return session.copy() if session is not None else None
+
+    def append(self, session_id, question, answer):
+        """Add an exchange to an issued session; returns False if it is unknown or expired."""
+        with self._lock:
+            self._expire()
+            session = self._sessions.get(session_id)
+            if session is None:
+                return False
+            self._counts["compactions"] += self.compactor.add(session, question, answer)
+            self._counts["appends"] += 1
+            self._sessions.move_to_end(session_id)
+            return True
+
+    def clear(self, session_id):
+        with self._lock:
+            return self._sessions.pop(session_id, None) is not None
+
+    def stats(self):
+        with self._lock:
+            self._expire()
+            sizes = [session.nbytes() for session in self._sessions.values()]
+            counts = dict(self._counts)
+        return {
+            "backend": self.backend,
+            "sessions": len(sizes),
+            **counts,
+            "total_bytes": sum(sizes),
+            "mean_bytes_per_session": sum(sizes) / len(sizes) if sizes else 0.0,
+            "max_bytes_per_session": max(sizes, default=0),
+            "ttl": self.ttl,
+            "max_sessions": self.max_sessions,
+        }
+
+
+class SQLiteSessionStore(MemorySessionStore):
+    """Sessions in a local SQLite file (SESSION_STORE_PATH), shared by every worker on the host.
+
+    Expiry and LRU eviction run on write, ordered by last update; memory per session is
+    reported as the bytes stored for it.
+    """
+
+    backend = "sqlite"
+
+    def __init__(self, path=None, ttl=None, max_sessions=None, compactor=None):
+        super().__init__(ttl, max_sessions, compactor)
+        self.path = path or os.getenv("SESSION_STORE_PATH", "sessions.sqlite3")
+        self._db = None
+        self._pid = None
+        self._connection()
+
+    def _connection(self):
+        # A SQLite connection must not cross a fork; pre-forked workers open their own
+        if self._pid != os.getpid():
+            self._db = sqlite3.connect(self.path, check_same_thread=False, timeout=10)
+            self._db.execute("CREATE TABLE IF NOT EXISTS sessions (session_id TEXT PRIMARY KEY, "
+                             "summary TEXT NOT NULL, turns TEXT NOT NULL, updated_at REAL NOT NULL)")
+            self._db.execute("CREATE INDEX IF NOT EXISTS sessions_updated_at ON sessions (updated_at)")
+            self._db.commit()
+            self._pid = os.getpid()
+        return self._db
+
+    def _expire(self):
+        db = self._connection()
+        cursor = db.execute("DELETE FROM sessions WHERE updated_at < ?", (time.time() - self.ttl,))
+        self._counts["expired"] += cursor.rowcount
+        cursor = db.execute("DELETE FROM sessions WHERE session_id NOT IN "
+                            "(SELECT session_id FROM sessions ORDER BY updated_at DESC LIMIT ?)", (self.max_sessions,))
+        self._counts["evicted"] += cursor.rowcount
+        db.commit()
+
+    def _load(self, session_id):
+        row = self._connection().execute(
+            "SELECT summary, turns, updated_at FROM sessions WHERE session_id = ? AND updated_at >= ?",
+            (session_id, time.time() - self.ttl)).fetchone()
+        if row is None:
+            return None
+        return Session(row[0], [tuple(turn) for turn in json.loads(row[1])], row[2])
+
+    def _write(self, session_id, session):
+        db = self._connection()
+        db.execute("INSERT OR REPLACE INTO sessions (session_id, summary, turns, updated_at) VALUES (?, ?, ?, ?)",
+                   (session_id, session.summary, json.dumps(session.turns), session.updated_at))
+        db.commit()
+        self._expire()
+
+    def create(self):
+        session_id = secrets.token_urlsafe(SESSION_ID_BYTES)
+        with self._lock:
+            self._write(session_id, Session())
+        return session_id
+
+    def history(self, session_id):
+        if not isinstance(session_id, str):
+            return None
+        with self._lock:
+            return self._load(session_id)
+
+    def append(self, session_id, question, answer):
+        with self._lock:
+            session = self._load(session_id)
+            if session is None:
+                return False
+            self._counts["compactions"] += self.compactor.add(session, question, answer)
+            self._counts["appends"] += 1
+            self._write(session_id, session)
+            return True
+
+    def clear(self, session_id):
+        with self._lock:
+            db = self._connection()
+            cursor = db.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+            db.commit()
+            return cursor.rowcount > 0
+
+    def stats(self):
+        with self._lock:
+            sessions, total, largest = self._connection().execute(
+                "SELECT COUNT(*), COALESCE(SUM(length(CAST(summary || turns AS BLOB))), 0), "
+                "COALESCE(MAX(length(CAST(summary || turns AS BLOB))), 0) FROM sessions WHERE updated_at >= ?",
+                (time.time() - self.ttl,)).fetchone()
+            counts = dict(self._counts)
+        return {
+            "backend": self.backend,
+            "sessions": sessions,
+            **counts,
+            "total_bytes": total,
+            "mean_bytes_per_session": total / sessions if sessions else 0.0,
+            "max_bytes_per_session": largest,
+            "ttl": self.ttl,
+            "max_sessions": self.max_sessions,
+        }
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_session_store():
+    """The process-wide session store: SESSION_STORE=memory (default) or sqlite."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = SQLiteSessionStore() if os.getenv("SESSION_STORE", "memory") == "sqlite" else MemorySessionStore()
+    return _store
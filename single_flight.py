@@ -0,0 +1,143 @@
+import os
+import asyncio
+import threading
+
+_registry = []
+_registry_lock = threading.Lock()
+
+
+def _register(flight):
+    with _registry_lock:
+        _registry.append(flight)
+
+
+def stats():
+    """Counters of every single-flight group in the process, by name."""
+    with _registry_lock:
+        flights = list(_registry)
+    return {flight.name: flight.stats() for flight in flights}
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class _Counters:
+    def __init__(self, name, timeout):
+        self.name = name
+        self.timeout = timeout if timeout is not None else float(os.getenv("SINGLE_FLIGHT_TIMEOUT", "30"))
+        self._counts = {"calls": 0, "executions": 0, "collapsed": 0, "timeouts": 0, "errors": 0}
+        self._counts_lock = threading.Lock()
+        _register(self)
+
+    def _count(self, counter):
+        with self._counts_lock:
+            self._counts[counter] += 1
+
+    def stats(self):
+        with self._counts_lock:
+            counts = dict(self._counts)
+        counts["collapse_rate"] = counts["collapsed"] / counts["calls"] if counts["calls"] else 0.0
+        counts["in_flight"] = len(self._calls)
+        return counts
+
+
+class SingleFlight(_Counters):
+    """Collapse concurrent identical calls into one execution whose result every caller gets.
+
+    The first caller for a key runs the function; callers arriving while it runs wait for
+    its result (or its exception). A waiter gives up after `timeout` seconds and runs the
+    function itself, so a stuck call never holds the others hostage.
+    """
+
+    def __init__(self, name, timeout=None):
+        self._calls = {}
+        self._lock = threading.Lock()
+        super().__init__(name, timeout)
+
+    def do(self, key, function, timeout=None):
+        self._count("calls")
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if leader:
+            self._count("executions")
+            try:
+                call.result = function()
+                return call.result
+            except Exception as e:
+                call.error = e
+                self._count("errors")
+                raise
+            finally:
+                with self._lock:
+                    self._calls.pop(key, None)
+                call.done.set()
+
+        if not call.done.wait(timeout if timeout is not None else self.timeout):
+            self._count("timeouts")
+            self._count("executions")
+            return function()
+        self._count("collapsed")
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+
+_CANCELLED = object()
+
+
+class AsyncSingleFlight(_Counters):
+    """asyncio variant of SingleFlight for the ASGI server; `factory` returns a coroutine."""
+
+    def __init__(self, name, timeout=None):
+        self._calls = {}
+        super().__init__(name, timeout)
+
+    async def do(self, key, factory, timeout=None):
+        self._count("calls")
+        future = self._calls.get(key)
+        if future is None:
+            future = self._calls[key] = asyncio.get_running_loop().create_future()
+            self._count("executions")
+            try:
+                result = await factory()
+                future.set_result(result)
+                return result
+            except asyncio.CancelledError:
+                # Only this caller was cancelled; waiters run the call themselves
+                future.set_result(_CANCELLED)
+                raise
+            except Exception as e:
+                self._count("errors")
+                future.set_exception(e)
+                future.exception()  # retrieved here, so asyncio does not log it when nobody waits
+                raise
+            finally:
+                self._calls.pop(key, None)
+
+        try:
+            result = await asyncio.wait_for(asyncio.shield(future), timeout if timeout is not None else self.timeout)
+        except asyncio.TimeoutError:
+            self._count("timeouts")
+            result = _CANCELLED
+        except Exception:
+            # The shared call failed; its error is this caller's result too
+            self._count("collapsed")
+            raise
+        if result is _CANCELLED:
+            self._count("executions")
+            return await factory()
+        self._count("collapsed")
+        return result
+
+
+def normalize_question(text):
+    """Key for FAQ questions: case and whitespace do not make a question different."""
+    return " ".join(str(text).lower().split())
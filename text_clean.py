@@ -0,0 +1,109 @@
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+from html.parser import HTMLParser
+
+# Tags whose text is never shown on the product page
+SKIPPED_TAGS = {"script", "style", "noscript", "template"}
+
+# Rough size of one LLM token in characters of English text
+CHARS_PER_TOKEN = 4
+
+
+class _TextExtractor(HTMLParser):
+    """Streaming tag stripper: keeps text nodes, drops markup and script/style bodies."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts = []
+        self._skipping = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in SKIPPED_TAGS:
+            self._skipping += 1
+        # Tags may separate words ("<li>a</li><li>b</li>"); whitespace is collapsed afterwards
+        self.parts.append(" ")
+
+    def handle_endtag(self, tag):
+        if tag in SKIPPED_TAGS and self._skipping:
+            self._skipping -= 1
+        self.parts.append(" ")
+
+    def handle_data(self, data):
+        if not self._skipping:
+            self.parts.append(data)
+
+
+def html_to_text(html):
+    """Strip tags and entities from an HTML fragment and collapse whitespace."""
+    if not html:
+        return ""
+    if "<" not in html and "&" not in html:
+        return " ".join(html.split())
+    parser = _TextExtractor()
+    parser.feed(html)
+    parser.close()
+    return " ".join("".join(parser.parts).split())
+
+
+def estimate_tokens(text):
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def truncate_tokens(text, max_tokens):
+    """Cut text to roughly `max_tokens` tokens, at a word boundary."""
+    if not max_tokens or estimate_tokens(text) <= max_tokens:
+        return text
+    cut = text[:max_tokens * CHARS_PER_TOKEN]
+    space = cut.rfind(" ")
+    return (cut[:space] if space > 0 else cut).rstrip(" ,;:-") + "..."
+
+
+class DescriptionCleaner:
+    """Turn product description HTML into prompt-ready text, memoized by content hash.
+
+    Results are kept in an LRU of `cache_size` entries, so a description is only parsed
+    again after it changes or falls out of the cache.
+    """
+
+    def __init__(self, max_tokens=None, cache_size=None):
+        self.max_tokens = max_tokens if max_tokens is not None else int(os.getenv("DESCRIPTION_MAX_TOKENS", "200"))
+        self.cache_size = cache_size or int(os.getenv("DESCRIPTION_CACHE_SIZE", "4096"))
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def clean(self, html, max_tokens=None):
+        if not html:
+            return ""
+        max_tokens = self.max_tokens if max_tokens is None else max_tokens
+        key = (hashlib.sha1(html.encode("utf-8")).digest(), max_tokens)
+        with self._lock:
+            text = self._cache.get(key)
+            if text is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return text
+            self.misses += 1
+
+        text = truncate_tokens(html_to_text(html), max_tokens)
+        with self._lock:
+            self._cache[key] = text
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return text
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self._cache)}
+
+
+# Shared by every pitch path
+cleaner = DescriptionCleaner()
+
+
+def clean_description(html, max_tokens=None):
+    """Prompt-ready text for a product description (see DescriptionCleaner)."""
+    return cleaner.clean(html, max_tokens)
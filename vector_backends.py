@@ -0,0 +1,242 @@
+"""FAISS index backends for the FAQ and product stores, plus a compact chunk metadata table.
+
+Backends (FAQ_INDEX_BACKEND / PRODUCT_INDEX_BACKEND):
+
+    flat   exact inner-product search, the baseline every other backend is measured against
+    ivf    inverted lists, searches VECTOR_NPROBE of ~4*sqrt(n) clusters
+    hnsw   graph search, VECTOR_HNSW_M links per node, VECTOR_EF_SEARCH candidates per query
+    sq8    every dimension scalar-quantized to one byte (int8), a quarter of flat's memory
+
+Vectors are L2-normalized, so every backend scores by cosine similarity. Recall and latency
+of each backend against flat: python benchmarks/eval_vector_backends.py
+"""
+import os
+import json
+import numpy as np
+import faiss
+from langchain_core.documents import Document
+
+BACKENDS = ("flat", "ivf", "hnsw", "sq8")
+
+INDEX_FILE = "index.faiss"
+TABLE_FILE = "table.json"
+VECTORS_FILE = "vectors.npy"
+
+
+def _ivf_lists(n):
+    lists = int(os.getenv("VECTOR_IVF_LISTS", "0")) or int(4 * np.sqrt(n))
+    # FAISS wants about 39 training points per list
+    return max(1, min(lists, n // 39))
+
+
+def index_spec(backend, dim, n):
+    """FAISS index_factory string for a backend, sized for n vectors.
+
+    Too few vectors to train on turns ivf into flat.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown vector index backend {backend!r}, expected one of {', '.join(BACKENDS)}")
+    if backend == "ivf" and n >= 39:
+        return f"IVF{_ivf_lists(n)},Flat"
+    if backend == "hnsw":
+        return f"HNSW{int(os.getenv('VECTOR_HNSW_M', '32'))}"
+    if backend == "sq8":
+        return "SQ8"
+    return "Flat"
+
+
+def build_index(vectors, backend="flat"):
+    """Train (when the backend needs it) and fill an inner-product index; vectors must be normalized."""
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    n, dim = vectors.shape
+    spec = index_spec(backend, dim, n)
+    if backend == "ivf" and spec == "Flat":
+        print(f"Only {n} vectors, too few to train a {backend} index; using {spec.lower()} instead")
+    index = faiss.index_factory(dim, spec, faiss.METRIC_INNER_PRODUCT)
+    if spec.startswith("HNSW"):
+        index.hnsw.efConstruction = int(os.getenv("VECTOR_EF_CONSTRUCTION", "80"))
+    if not index.is_trained:
+        index.train(vectors)
+    index.add(vectors)
+    configure_search(index)
+    return index
+
+
+def configure_search(index, nprobe=None, ef_search=None):
+    """Apply the query-time knobs (VECTOR_NPROBE, VECTOR_EF_SEARCH)."""
+    params = faiss.ParameterSpace()
+    if faiss.try_extract_index_ivf(index) is not None:
+        params.set_index_parameter(index, "nprobe", nprobe or int(os.getenv("VECTOR_NPROBE", "8")))
+    elif hasattr(index, "hnsw"):
+        params.set_index_parameter(index, "efSearch", ef_search or int(os.getenv("VECTOR_EF_SEARCH", "64")))
+    return index
+
+
+# Tried in order: IO_FLAG_MMAP_IFC maps the stored codes of flat, SQ8 and HNSW indexes (and
+# IVF inverted lists); IO_FLAG_MMAP maps only IVF inverted lists
+MMAP_FLAGS = (faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_READ_ONLY, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+
+
+def read_index(path, use_mmap=True):
+    """Read a FAISS index, memory-mapped read-only when possible so forked workers share its pages.
+
+    A mapped index must not be added to or removed from; change a copy_index() of it instead.
+    """
+    if use_mmap:
+        for flags in MMAP_FLAGS:
+            try:
+                return configure_search(faiss.read_index(path, flags))
+            except RuntimeError:
+                continue
+        print(f"Could not memory-map {path}, reading it into memory")
+    return configure_search(faiss.read_index(path))
+
+
+def copy_index(index):
+    """A writable in-memory copy; faiss.clone_index would keep viewing a mapped index's file."""
+    return faiss.deserialize_index(faiss.serialize_index(index))
+
+
+class ChunkTable:
+    """Per-row metadata kept in a few numpy arrays instead of one Python object per row.
+
+    A string column is one UTF-8 byte buffer plus an offsets array; a numeric column is a
+    plain array. Row i belongs to FAISS id i. Saved as .npy files that load memory-mapped.
+    """
+
+    def __init__(self, columns):
+        self.columns = columns  # name -> array, or (bytes buffer, offsets) for strings
+
+    @classmethod
+    def from_columns(cls, values):
+        """Build from {name: list of values}; lists of ints become int64 columns, the rest strings."""
+        columns = {}
+        for name, column in values.items():
+            if all(isinstance(value, (int, np.integer)) for value in column):
+                columns[name] = np.asarray(column, dtype=np.int64)
+                continue
+            encoded = [str(value).encode("utf-8") for value in column]
+            offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+            offsets[1:] = np.cumsum([len(value) for value in encoded])
+            columns[name] = (np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets)
+        return cls(columns)
+
+    def __len__(self):
+        column = next(iter(self.columns.values()), None)
+        if column is None:
+            return 0
+        return len(column[1]) - 1 if isinstance(column, tuple) else len(column)
+
+    def value(self, name, row):
+        column = self.columns[name]
+        if isinstance(column, tuple):
+            buffer, offsets = column
+            return bytes(buffer[offsets[row]:offsets[row + 1]]).decode("utf-8")
+        return int(column[row])
+
+    def row(self, row):
+        return {name: self.value(name, row) for name in self.columns}
+
+    def nbytes(self):
+        return sum(sum(part.nbytes for part in column) if isinstance(column, tuple) else column.nbytes
+                   for column in self.columns.values())
+
+    def save(self, directory):
+        kinds = {}
+        for name, column in self.columns.items():
+            if isinstance(column, tuple):
+                np.save(os.path.join(directory, f"{name}.bytes.npy"), column[0])
+                np.save(os.path.join(directory, f"{name}.offsets.npy"), column[1])
+                kinds[name] = "str"
+            else:
+                np.save(os.path.join(directory, f"{name}.npy"), column)
+                kinds[name] = "int"
+        with open(os.path.join(directory, TABLE_FILE), "w") as f:
+            json.dump(kinds, f)
+
+    @classmethod
+    def load(cls, directory, use_mmap=True):
+        def load_array(name):
+            path = os.path.join(directory, name)
+            # An empty array cannot be memory-mapped
+            if use_mmap and os.path.getsize(path) > 128:
+                return np.load(path, mmap_mode="r")
+            return np.load(path)
+
+        with open(os.path.join(directory, TABLE_FILE)) as f:
+            kinds = json.load(f)
+        return cls({
+            name: (load_array(f"{name}.bytes.npy"), load_array(f"{name}.offsets.npy")) if kind == "str"
+            else load_array(f"{name}.npy")
+            for name, kind in kinds.items()
+        })
+
+
+class CompactVectorStore:
+    """Vector store over any backend, answering the same similarity_search_by_vector calls as
+    LangChain's FAISS store but keeping chunk text and metadata in a ChunkTable.
+
+    The normalized float vectors are saved next to the index only so a rebuild can reuse the
+    embeddings of unchanged chunks; they are never loaded for search.
+    """
+
+    def __init__(self, index, table, backend, vectors_path=None):
+        self.index = index
+        self.table = table
+        self.backend = backend
+        self.vectors_path = vectors_path
+
+    @classmethod
+    def from_vectors(cls, vectors, documents, ids, backend="flat"):
+        vectors = np.array(vectors, dtype=np.float32)
+        faiss.normalize_L2(vectors)
+        table = ChunkTable.from_columns({
+            "id": ids,
+            "text": [document.page_content for document in documents],
+            "metadata": [json.dumps(document.metadata, sort_keys=True) for document in documents],
+        })
+        store = cls(build_index(vectors, backend), table, backend)
+        store._vectors = vectors
+        return store
+
+    @property
+    def ids(self):
+        return [self.table.value("id", row) for row in range(len(self.table))]
+
+    def vectors_by_id(self):
+        """{chunk id: normalized vector} from the saved copy, for reuse when rebuilding."""
+        vectors = getattr(self, "_vectors", None)
+        if vectors is None and self.vectors_path and os.path.exists(self.vectors_path):
+            vectors = np.load(self.vectors_path, mmap_mode="r")
+        if vectors is None:
+            return {}
+        return dict(zip(self.ids, vectors))
+
+    def document(self, row):
+        return Document(page_content=self.table.value("text", row),
+                        metadata=json.loads(self.table.value("metadata", row)),
+                        id=self.table.value("id", row))
+
+    def similarity_search_with_score_by_vector(self, embedding, k=4):
+        """[(Document, cosine similarity)] for the k nearest chunks, best first."""
+        query = np.asarray([embedding], dtype=np.float32)
+        faiss.normalize_L2(query)
+        scores, rows = self.index.search(query, k)
+        return [(self.document(int(row)), float(score)) for score, row in zip(scores[0], rows[0]) if row != -1]
+
+    def similarity_search_by_vector(self, embedding, k=4):
+        return [document for document, _ in self.similarity_search_with_score_by_vector(embedding, k)]
+
+    def save(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        faiss.write_index(self.index, os.path.join(directory, INDEX_FILE))
+        self.table.save(directory)
+        vectors = getattr(self, "_vectors", None)
+        if vectors is not None:
+            np.save(os.path.join(directory, VECTORS_FILE), vectors)
+
+    @classmethod
+    def load(cls, directory, backend, use_mmap=True):
+        return cls(read_index(os.path.join(directory, INDEX_FILE), use_mmap),
+                   ChunkTable.load(directory, use_mmap), backend,
+                   vectors_path=os.path.join(directory, VECTORS_FILE))